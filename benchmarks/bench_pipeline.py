@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Offline benchmarks of the hot path of myodds
+Runs the html extractors, the Analyzer and the telegram message composition
+on saved oddschecker pages and synthetic odds of 10 to 100k matches and
+reports throughput and peak memory per stage
+> python benchmarks/bench_pipeline.py [--fixtures benchmarks/fixtures] [--sizes 10 1000]
+"""
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from myodds.analyzer import Analyzer  # noqa: E402
+from myodds.constants import (  # noqa: E402
+    BetType,
+    COLUMNS,
+    DAY,
+    DAYDATE,
+    ODDS,
+    PLAY_TIME,
+    SPORT_INFO,
+    TEAMS,
+)
+from myodds.model import to_records  # noqa: E402
+from myodds.scraper.extractors import EXTRACTORS, build_matches, get_extractor  # noqa: E402
+
+
+SIZES = [10, 100, 1_000, 10_000, 100_000]
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+GAMES_PER_DAY = 10
+
+
+def measure(stage: str, size: int, func: Callable[[], Any], repeat: int) -> Dict[str, Any]:
+    """
+    Times a stage (best of repeat runs) and measures its peak memory in an extra run
+    :param stage: Name of the stage
+    :param size: Number of matches processed by one run
+    :param func: Function running the stage once
+    :param repeat: Number of timed runs
+    :return: Result of the stage
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    best = min(timings)
+    return {
+        "stage": stage,
+        "matches": size,
+        "seconds": best,
+        "matches_per_second": size / best if best > 0 else float("inf"),
+        "peak_memory_mb": peak / 2**20,
+    }
+
+
+def synthetic_odds(size: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Creates scraped looking data with random odds, about a third are sure bets
+    :param size: Number of matches
+    :param seed: Seed of the random generator
+    :return: Dataframe with the scraper columns
+    """
+    rng = np.random.default_rng(seed)
+    odds = np.round(rng.uniform(1.8, 4.8, size=(size, 3)), 2)
+    books = rng.choice(["Bet365", "Snai", "Sisal", "Eurobet", "Goldbet"], size=(size, 3))
+    return pd.DataFrame(
+        {
+            "date": "Oggi",
+            "play_time": "20:45",
+            "sport": "Football",
+            "sport_subdivision": "Benchmark",
+            "data_source": "https://www.oddschecker.com/it/benchmark",
+            "team1": [f"Home {i}" for i in range(size)],
+            "team2": [f"Away {i}" for i in range(size)],
+            "home_odds": odds[:, 0],
+            "draw_odds": odds[:, 1],
+            "away_odds": odds[:, 2],
+            "home_book": books[:, 0],
+            "draw_book": books[:, 1],
+            "away_book": books[:, 2],
+        },
+        columns=COLUMNS,
+    )
+
+
+def synthetic_page(size: int) -> str:
+    """
+    Creates a page with the markup of an oddschecker listing
+    :param size: Number of matches on the page
+    :return: Html of the page
+    """
+    df = synthetic_odds(size)
+    days = []
+    for start in range(0, size, GAMES_PER_DAY):
+        rows = df.iloc[start : start + GAMES_PER_DAY]
+        times = "".join(f'<div class="{PLAY_TIME}">20:45</div>' for _ in range(len(rows)))
+        games = "".join(
+            f'<div class="{SPORT_INFO}">'
+            f'<div class="{TEAMS}">{row.team1}</div><div class="{TEAMS}">{row.team2}</div>'
+            + "".join(
+                f'<div class="{ODDS}"><img alt="{book}" src="/{book}.png"/>{odd}</div>'
+                for odd, book in (
+                    (row.home_odds, row.home_book),
+                    (row.draw_odds, row.draw_book),
+                    (row.away_odds, row.away_book),
+                )
+            )
+            + "</div>"
+            for row in rows.itertuples()
+        )
+        days.append(
+            f'<ul class="{DAY}"><div class="{DAYDATE}">Oggi</div>{times}{games}</ul>'
+        )
+    return f"<html><body>{''.join(days)}</body></html>"
+
+
+def bench_parsing(pages: Dict[str, str], repeat: int) -> List[Dict[str, Any]]:
+    """
+    Benchmarks every html extractor that is installed on the given pages
+    :param pages: Html of the pages by name
+    :param repeat: Number of timed runs
+    :return: Results
+    """
+    results = []
+    for name, extractor_class in EXTRACTORS.items():
+        if extractor_class.in_page:
+            continue
+        extractor = get_extractor(name)
+        if extractor.name != name:
+            continue
+        for page_name, content in pages.items():
+            size = len(build_matches(extractor.parse(content), "football", page_name, ""))
+            result = measure(
+                f"parse[{name}] {page_name}",
+                size,
+                lambda: build_matches(extractor.parse(content), "football", page_name, ""),
+                repeat,
+            )
+            results.append(result)
+    return results
+
+
+def bench_analyzer(sizes: List[int], repeat: int) -> List[Dict[str, Any]]:
+    """
+    Benchmarks the sure bet check and the credible values on synthetic odds
+    :param sizes: Number of matches
+    :param repeat: Number of timed runs
+    :return: Results
+    """
+    results = []
+    for size in sizes:
+        df = synthetic_odds(size)
+        results.append(
+            measure(
+                "check_is_sure_bet",
+                size,
+                lambda: Analyzer.check_is_sure_bet(df.copy(), 0.01),
+                repeat,
+            )
+        )
+        checked = Analyzer.check_is_sure_bet(df.copy(), 0.01)
+        results.append(
+            measure(
+                "get_credible_values",
+                size,
+                lambda: Analyzer.get_credible_values(checked, 10, 80),
+                repeat,
+            )
+        )
+    return results
+
+
+def bench_compose(sizes: List[int], repeat: int) -> List[Dict[str, Any]]:
+    """
+    Benchmarks composing the telegram messages of sure bets
+    :param sizes: Number of sure bets
+    :param repeat: Number of timed runs
+    :return: Results, empty if python-telegram-bot is not installed
+    """
+    try:
+        from myodds.rpc.telegram import Telegram
+    except ImportError:
+        print("python-telegram-bot is not installed, skipping compose_sure_bet")
+        return []
+    # composing does not need a connection, so skip __init__ which starts the sender thread
+    telegram = Telegram.__new__(Telegram)
+    df = synthetic_odds(max(sizes))
+    df = Analyzer.check_is_sure_bet(df, -1)
+    df = Analyzer.get_credible_values(df, 10, 80)
+    bets = to_records(df)
+    results = []
+    for size in sizes:
+        results.append(
+            measure(
+                "compose_sure_bet",
+                size,
+                lambda: [
+                    telegram.compose_sure_bet({**bet, "bet_type": BetType.SURE_BET})
+                    for bet in bets[:size]
+                ],
+                repeat,
+            )
+        )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline benchmarks of myodds")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--fixtures", type=Path, default=FIXTURES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", type=Path, help="Write the results as json")
+    args = parser.parse_args()
+
+    pages = {path.stem: path.read_text() for path in sorted(args.fixtures.glob("*.html"))}
+    # synthetic pages above 10k matches take longer to build than to parse
+    pages.update({f"synthetic-{size}": synthetic_page(size) for size in args.sizes if size <= 10_000})
+
+    results = bench_parsing(pages, args.repeat)
+    results += bench_analyzer(args.sizes, args.repeat)
+    results += bench_compose(args.sizes, args.repeat)
+
+    print(f"{'stage':<40} {'matches':>8} {'seconds':>10} {'matches/s':>12} {'peak MB':>9}")
+    for result in results:
+        print(
+            f"{result['stage']:<40} {result['matches']:>8} {result['seconds']:>10.5f} "
+            f"{result['matches_per_second']:>12.0f} {result['peak_memory_mb']:>9.2f}"
+        )
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Checks that myodds starts fast enough for single runs and health checks
+Measures the import time of the bot, which the command line entry point
+imports before a run, in a fresh interpreter and fails if it is above the budget
+> python benchmarks/bench_startup.py [--budget 2.0] [--top 10]
+"""
+
+import argparse
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+
+ROOT = Path(__file__).resolve().parents[1]
+# what a run imports, main itself only imports argparse and the utils
+MODULE = "myodds.myoddsbot"
+
+
+def import_times(module: str) -> Tuple[float, List[Tuple[float, str]]]:
+    """
+    Imports a module in a fresh interpreter with -X importtime
+    :param module: Module to import
+    :return: Wall time of the interpreter and (cumulative seconds, module) of every import
+    """
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    wall = time.perf_counter() - start
+    imports = []
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|(\s*)(\S+)", line)
+        if match:
+            imports.append((int(match.group(1)) / 1e6, match.group(3)))
+    return wall, imports
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Startup time budget of myodds")
+    parser.add_argument("--budget", type=float, default=2.0, help="Seconds allowed")
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports to show")
+    args = parser.parse_args()
+
+    wall, imports = import_times(MODULE)
+    print(f"{'module':<40} {'cumulative s':>12}")
+    for seconds, module in sorted(imports, reverse=True)[: args.top]:
+        print(f"{module:<40} {seconds:>12.4f}")
+    print(f"\nStarting python and importing {MODULE} took {wall:.3f}s (budget {args.budget:.3f}s)")
+    if wall > args.budget:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Regression check of the stake allocation across cycles, without a browser.
+A sure bet which could not be funded has to be notified once an open sure bet
+closes and frees the bankroll, even if its own odds and its page did not change.
+Exits with 1 if it is not
+> python benchmarks/check_allocation.py
+"""
+
+import logging
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from myodds.constants import BetType  # noqa: E402
+from myodds.model import MatchTable  # noqa: E402
+from myodds.myoddsbot import MyOddsBot  # noqa: E402
+
+
+CONFIG = {
+    "min_win_perc": 0.0,
+    "min_bet": 30,
+    "max_bet": 80,
+    "check_sure_bet": True,
+    "telegram": {"enabled": False},
+    "allocation": {"enabled": True, "bankroll": 100},
+}
+SURE_BET_ODDS = [3.3, 3.3, 3.3]
+CLOSED_ODDS = [2.0, 3.0, 3.0]
+
+
+class RecordingBot(MyOddsBot):
+    """
+    Bot remembering the teams of the sure bets it notified
+    """
+
+    def __init__(self, config: Dict[str, Any]) -> None:
+        super().__init__(config)
+        self.notified: List[str] = []
+
+    def prepare_send_message(self, df: pd.DataFrame, bet_type: BetType) -> None:
+        self.notified.extend(df["team1"].tolist())
+
+
+def get_division(odds: Dict[str, List[float]], unchanged: bool = False) -> pd.DataFrame:
+    """
+    Scraped matches of one subdivision
+    :param odds: Home, draw and away odds of every home team
+    :param unchanged: Whether the scraper found the page unchanged
+    :return: Dataframe with scraped data
+    """
+    table = MatchTable()
+    for team, (home, draw, away) in odds.items():
+        table.append(
+            {
+                "date": "21/01",
+                "play_time": "20:45",
+                "sport": "Football",
+                "sport_subdivision": "Serie A",
+                "data_source": "",
+                "team1": team,
+                "team2": "Away",
+                "home_odds": home,
+                "draw_odds": draw,
+                "away_odds": away,
+                "home_book": "A",
+                "draw_book": "B",
+                "away_book": "C",
+            }
+        )
+    df = table.to_frame(time.time())
+    df.attrs["unchanged"] = unchanged
+    return df
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.WARNING)
+    bot = RecordingBot(CONFIG)
+    cycles = [
+        # the bankroll only funds H0
+        ({"H0": SURE_BET_ODDS, "H1": SURE_BET_ODDS}, False, ["H0"]),
+        # nothing changed and H0 still holds its stakes
+        ({"H0": SURE_BET_ODDS, "H1": SURE_BET_ODDS}, True, []),
+        # H0 closed, H1 can be funded with the freed bankroll
+        ({"H0": CLOSED_ODDS, "H1": SURE_BET_ODDS}, False, ["H1"]),
+    ]
+    failed = False
+    try:
+        for cycle, (odds, unchanged, expected) in enumerate(cycles, start=1):
+            bot.notified = []
+            bot.analyze({("football", "Serie A"): get_division(odds, unchanged)})
+            status = "ok" if bot.notified == expected else "FAILED"
+            failed = failed or bot.notified != expected
+            print(f"cycle {cycle}: notified {bot.notified}, expected {expected} {status}")
+    finally:
+        bot.stop()
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Saves the html of every page in SPORTS into benchmarks/fixtures,
+so the parsing benchmarks can run offline on real pages
+> python benchmarks/record_fixtures.py (needs a config.json and playwright)
+"""
+
+import asyncio
+import re
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from myodds.constants import SPORTS  # noqa: E402
+from myodds.scraper import Scraper  # noqa: E402
+from myodds.utils import get_divisions, load_config  # noqa: E402
+
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+
+async def record() -> None:
+    scraper = Scraper(load_config())
+    await scraper._get_browser_page()
+    FIXTURES.mkdir(exist_ok=True)
+    try:
+        for sport, division, url in get_divisions(SPORTS):
+            async with scraper.pool.page() as page:
+                content = await scraper._get_html(page, url)
+            name = re.sub(r"[^a-z0-9]+", "-", f"{sport}-{division}".lower())
+            (FIXTURES / f"{name}.html").write_text(content)
+            print(f"Saved {sport}: {division}")
+    finally:
+        await scraper._stop_browser()
+
+
+if __name__ == "__main__":
+    asyncio.run(record())
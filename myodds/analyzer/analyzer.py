@@ -1,10 +1,19 @@
 import logging
-from typing import List
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
 
-from myodds.constants import COLUMNS, INVEST_AMOUNT_DECIMALS
+from myodds.constants import (
+    BOOK_COLUMNS,
+    INVEST_AMOUNT_DECIMALS,
+    INVEST_PERCENTAGE_COLUMNS,
+    INVEST_PERCENTAGE_DECIMALS,
+    INVEST_SEARCH_BUFFER_SIZE,
+    INVEST_SEARCH_STEP,
+    INVEST_VALUE_COLUMNS,
+    ODDS_COLUMNS,
+)
 
 
 logger = logging.getLogger(__name__)
@@ -19,35 +28,47 @@ class Analyzer:
     @staticmethod
     def check_is_sure_bet(df: pd.DataFrame, min_win_perc: float) -> pd.DataFrame:
         """
-        Goes over the rows of the dataframe and checks if there is a sure bet
+        Checks all rows of the dataframe at once if there is a sure bet.
+        Missing outcomes (e.g. the draw of a 2 way sport) are ignored
         :param df: Dataframe containing all data
         :param min_win_perc: Minium win percentage that the user want to be achived for considering the bet
         :return: Dataframe with check for sure bet with respective invest percentages of the portfolio
         """
-        cols = [col for col in COLUMNS if "odds" in col]
-        odds = df[cols].to_numpy()
-        reciprocal: List = []
-        sure_bets: List = []
-        invest: List = []
-        for bet in odds:
-            odds_cost = 1 / bet
-            # Transform this cost to a percentage (The percentage that should be invested at each option)
-            odd_percentage = odds_cost / np.sum(odds_cost)
-            # Calculate the cost of the bet (The money that would cost to win an euro) [If positive it is a sure bet]
-            total_euro_cost = 1 - np.sum(odds_cost) - min_win_perc
-            reciprocal.append(np.round(np.sum(odds_cost), 5))
-            if total_euro_cost > 0:
-                sure_bets.append(True)
-                invest.append(list(np.round(odd_percentage, 4)))
-            else:
-                sure_bets.append(False)
-                invest.append(0)
+        odds = df[ODDS_COLUMNS].to_numpy(dtype=float)
+        reciprocal, sure_bets, invest = Analyzer._sure_bet_arrays(odds, min_win_perc)
         df["reciprocal"] = reciprocal
         df["is_sure_bet"] = sure_bets
-        df["invest_percentages"] = invest
-        logger.info(df)
+        # only sure bets get invest percentages, the other rows stay NaN
+        df[INVEST_PERCENTAGE_COLUMNS] = np.where(sure_bets[:, None], invest, np.nan)
+        logger.info(f"{int(sure_bets.sum())} sure bets in {len(df)} matches")
+        logger.debug(df)
         return df
 
+    @staticmethod
+    def _sure_bet_arrays(
+        odds: np.ndarray, min_win_perc: float
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Vectorized sure bet check over a matrix of odds (one row per match)
+        :param odds: Odds matrix, missing outcomes as NaN
+        :param min_win_perc: Minium win percentage that the user want to be achived for considering the bet
+        :return: Rounded reciprocal, sure bet mask and rounded invest percentages
+        """
+        # Cost of each option to win one euro, a missing outcome costs nothing
+        odds_cost = np.divide(1.0, odds, out=np.zeros_like(odds), where=odds > 0)
+        total_cost = odds_cost.sum(axis=1)
+        # Transform this cost to a percentage (The percentage that should be invested at each option)
+        odd_percentage = np.divide(
+            odds_cost,
+            total_cost[:, None],
+            out=np.zeros_like(odds_cost),
+            where=total_cost[:, None] > 0,
+        )
+        # The money that would be left of an euro after covering all options [If positive it is a sure bet]
+        total_euro_cost = 1 - total_cost - min_win_perc
+        sure_bets = (total_euro_cost > 0) & (total_cost > 0)
+        return np.round(total_cost, 5), sure_bets, np.round(odd_percentage, INVEST_PERCENTAGE_DECIMALS)
+
     @staticmethod
     def get_credible_values(
         df: pd.DataFrame, min_bet: float, max_bet: float
@@ -60,27 +81,337 @@ class Analyzer:
         :param max_bet: Maximum investing sum amount
         :return: Dataframe containing the recommended investment amounts and expected wins
         """
-        df = df.copy()
-        df = df[df["is_sure_bet"] == True]
-        vals = df["invest_percentages"].to_numpy()
-        invest: List = []
-        for values in vals:
-            all_posible_bets = np.arange(start=min_bet, stop=max_bet, step=0.01)
-            all_posible_bets = np.repeat(all_posible_bets, len(values)).reshape(
-                -1, len(values)
-            )
-            values = (
-                np.repeat(a=values, repeats=len(all_posible_bets))
-                .reshape(len(values), -1)
-                .T
+        df = df[df["is_sure_bet"] == True].copy()
+        percentages = df[INVEST_PERCENTAGE_COLUMNS].to_numpy(dtype=float)
+        df[INVEST_VALUE_COLUMNS] = Analyzer._search_invest_values(percentages, min_bet, max_bet)
+        df["expected_win"] = np.round((1 - df["reciprocal"]), 5)
+        return df
+
+    @staticmethod
+    def _search_invest_values(
+        percentages: np.ndarray, min_bet: float, max_bet: float
+    ) -> np.ndarray:
+        """
+        Searches for every bet the total amount of np.arange(min_bet, max_bet,
+        INVEST_SEARCH_STEP) whose split loses the least to rounding. The loss only
+        has its minima next to the totals where an invest value lands on the
+        rounding grid and repeats after a period, so only those totals of the
+        first period are tried. Bets are searched together in chunks of about
+        INVEST_SEARCH_BUFFER_SIZE totals
+        :param percentages: Invest percentages, one row per bet
+        :param min_bet: Minium investing sum amount
+        :param max_bet: Maximum investing sum amount
+        :return: Rounded invest values, one row per bet
+        """
+        n_bets, n_outcomes = percentages.shape
+        best_invest = np.zeros((n_bets, n_outcomes))
+        # np.arange fills its values as start + i * ((start + step) - start)
+        step = (min_bet + INVEST_SEARCH_STEP) - min_bet
+        n_steps = max(int(np.ceil((max_bet - min_bet) / INVEST_SEARCH_STEP)), 0)
+        if n_bets == 0 or n_steps == 0:
+            return best_invest
+        limits = np.minimum(Analyzer._get_invest_periods(percentages), n_steps)
+        # every invest value crosses the grid about total / grid times, two steps each
+        grid = 10.0**-INVEST_AMOUNT_DECIMALS
+        sizes = np.cumsum(2 * (limits - 1) * step / grid + 2 * n_outcomes + 2)
+        start = 0
+        while start < n_bets:
+            done = sizes[start - 1] if start else 0.0
+            stop = max(
+                start + 1,
+                int(np.searchsorted(sizes, done + INVEST_SEARCH_BUFFER_SIZE, "right")),
             )
-            possible_invests = values * all_posible_bets
-            possible_rounded_invests = np.round(
-                possible_invests, INVEST_AMOUNT_DECIMALS
+            shares = percentages[start:stop]
+            rows, steps = Analyzer._get_invest_candidates(
+                shares, min_bet, step, limits[start:stop]
             )
+            possible_invests = shares[rows] * (min_bet + steps * step)[:, None]
+            possible_rounded_invests = np.round(possible_invests, INVEST_AMOUNT_DECIMALS)
             losses = np.sum(np.abs(possible_rounded_invests - possible_invests), axis=1)
-            best_invest = possible_rounded_invests[np.argmin(losses)]
-            invest.append(best_invest.tolist())  # to list only for testing
-        df["invest_values"] = invest
-        df["expected_win"] = np.round((1 - df["reciprocal"]), 5)
+            firsts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+            row_losses = np.minimum.reduceat(losses, firsts)
+            # the first step with the least loss, like np.argmin over the full range
+            best_steps = np.minimum.reduceat(
+                np.where(losses == row_losses[rows], steps, n_steps), firsts
+            )
+            possible_invests = shares * (min_bet + best_steps * step)[:, None]
+            best_invest[start:stop] = np.round(possible_invests, INVEST_AMOUNT_DECIMALS)
+            start = stop
+        return best_invest
+
+    @staticmethod
+    def _get_invest_candidates(
+        shares: np.ndarray, min_bet: float, step: float, limits: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Steps of the totals which can have the least rounding loss. Between two
+        totals where an invest value lands on the rounding grid the loss is
+        concave, so its minimum over the steps is at the first or last step
+        :param shares: Invest percentages, one row per bet
+        :param min_bet: Minium investing sum amount
+        :param step: Step between the totals
+        :param limits: Number of steps to search for every bet
+        :return: Bet and step of every candidate, grouped by bet
+        """
+        n_bets, n_outcomes = shares.shape
+        grid = 10.0**-INVEST_AMOUNT_DECIMALS
+        max_total = min_bet + (limits - 1) * step
+        # multiples of the grid every invest value passes
+        first = np.ceil(shares * min_bet / grid)
+        last = np.floor(shares * max_total[:, None] / grid)
+        counts = np.where(shares > 0, np.maximum(last - first + 1, 0), 0)
+        counts = counts.astype(int).ravel()
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        multiples = np.repeat(first.ravel(), counts) + offsets
+        on_grid = np.floor(
+            (multiples * grid / np.repeat(shares.ravel(), counts) - min_bet) / step
+        )
+        grid_rows = np.repeat(np.repeat(np.arange(n_bets), n_outcomes), counts)
+        rows = np.concatenate([grid_rows, grid_rows, np.arange(n_bets), np.arange(n_bets)])
+        steps = np.concatenate(
+            [on_grid, on_grid + 1, np.zeros(n_bets), limits - 1]
+        ).astype(int)
+        valid = (steps >= 0) & (steps < limits[rows])
+        rows, steps = rows[valid], steps[valid]
+        # rows is made of a few sorted runs, which a stable sort merges quickly
+        order = np.argsort(rows, kind="stable")
+        return rows[order], steps[order]
+
+    @staticmethod
+    def _get_invest_periods(percentages: np.ndarray) -> np.ndarray:
+        """
+        Number of steps after which the rounding losses of a bet repeat, which
+        is when every invest value moved by a multiple of the rounding grid
+        :param percentages: Invest percentages, one row per bet
+        :return: Period in steps of every bet, huge if its percentages are not rounded
+        """
+        scale = 10**INVEST_PERCENTAGE_DECIMALS
+        units = np.round(percentages * scale)
+        rounded = np.all(np.abs(units / scale - percentages) <= 1e-12, axis=1)
+        # steps of the total per grid step of an invest value of 1 / scale
+        grid_steps = round(scale * 10.0**-INVEST_AMOUNT_DECIMALS / INVEST_SEARCH_STEP)
+        units = units.astype(np.int64)
+        cycles = np.where(units > 0, grid_steps // np.gcd(units, grid_steps), 1)
+        periods = np.lcm.reduce(cycles, axis=1)
+        return np.where(rounded, periods, np.iinfo(np.int64).max)
+
+    @staticmethod
+    def allocate_stakes(
+        df: pd.DataFrame,
+        bankroll: float,
+        min_bet: float,
+        max_bet: float,
+        book_balances: Optional[Dict[str, float]] = None,
+        book_caps: Optional[Dict[str, float]] = None,
+    ) -> pd.DataFrame:
+        """
+        Splits the bankroll over all sure bets of a cycle at once, so the stakes
+        can be placed together. Bets are funded greedily by their guaranteed return,
+        each as much as max_bet, the bankroll left, the balance left at its
+        bookmakers and their stake caps allow. Bets that can not get min_bet are dropped
+        :param df: Dataframe containing the sure bets with their invest percentages
+        :param bankroll: Total amount that can be invested in the cycle
+        :param min_bet: Minium investing sum amount of a bet
+        :param max_bet: Maximum investing sum amount of a bet
+        :param book_balances: Amount available at a bookmaker for all bets, unlimited if missing
+        :param book_caps: Maximum stake a bookmaker accepts on a bet, unlimited if missing
+        :return: Dataframe with the funded sure bets and their rounded invest values
+        """
+        book_balances = book_balances or {}
+        book_caps = book_caps or {}
+        percentages = df[INVEST_PERCENTAGE_COLUMNS].to_numpy(dtype=float)
+        books = df[BOOK_COLUMNS].to_numpy(dtype=object)
+        # guaranteed profit per unit invested
+        rates = 1 / df["reciprocal"].to_numpy(dtype=float) - 1
+        scale = 10**INVEST_AMOUNT_DECIMALS
+        balances = {book: float(amount) for book, amount in book_balances.items()}
+        invest = np.zeros_like(percentages)
+        left = float(bankroll)
+        for i in np.argsort(-rates, kind="stable"):
+            # share of the total of the bet placed at every bookmaker
+            shares: Dict[str, float] = {}
+            for book, percentage in zip(books[i], percentages[i]):
+                if percentage > 0:
+                    shares[book] = shares.get(book, 0.0) + percentage
+            total = min(max_bet, left)
+            for book, share in shares.items():
+                total = min(
+                    total,
+                    balances.get(book, np.inf) / share,
+                    book_caps.get(book, np.inf) / share,
+                )
+            # rounded down, so the rounded stakes still fit the limits
+            values = np.floor(np.round(percentages[i] * total * scale, 6)) / scale
+            if values.sum() < min_bet:
+                continue
+            invest[i] = values
+            left -= values.sum()
+            for book, value in zip(books[i], values):
+                if book in balances:
+                    balances[book] -= value
+        funded = invest.sum(axis=1) > 0
+        logger.info(
+            f"Allocated {bankroll - left:.{INVEST_AMOUNT_DECIMALS}f} of {bankroll} "
+            f"to {int(funded.sum())} of {len(df)} sure bets"
+        )
+        df = df[funded].copy()
+        df[INVEST_VALUE_COLUMNS] = np.round(invest[funded], INVEST_AMOUNT_DECIMALS)
         return df
+
+    @staticmethod
+    def build_odds_grid(
+        grids: List[Optional[Dict[str, List[Optional[float]]]]],
+        book_names: Optional[Dict[str, str]] = None,
+    ) -> Tuple[np.ndarray, List[str]]:
+        """
+        Stacks the odds tables of the match pages into one matrix. Books are
+        renamed to the names of the listing before anything looks them up, so
+        excluded, sharp, capped and funded books are always listing names
+        :param grids: For every match {book: [odds of every outcome]} or None
+        :param book_names: Listing name of the books the match page only has a code for
+        :return: Odds of shape (matches, books, outcomes) with NaN where missing and the books
+        """
+        book_names = book_names or {}
+        books = sorted({book_names.get(book, book) for grid in grids if grid for book in grid})
+        index = {book: i for i, book in enumerate(books)}
+        odds = np.full((len(grids), len(books), len(ODDS_COLUMNS)), np.nan)
+        for match, grid in enumerate(grids):
+            for book, values in (grid or {}).items():
+                values = [np.nan if value is None else value for value in values]
+                if len(values) == 2:
+                    # 2 way markets only have home and away
+                    values = [values[0], np.nan, values[1]]
+                values = values[: len(ODDS_COLUMNS)]
+                column = odds[match, index[book_names.get(book, book)], : len(values)]
+                # codes renamed to the same book keep its best odds
+                column[:] = np.fmax(column, values)
+        return odds, books
+
+    @staticmethod
+    def get_best_allowed_odds(
+        grid: np.ndarray, allowed: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Best odd of every outcome over the allowed bookmakers. Taking the best odd
+        per outcome gives the best sure bet over any subset of the allowed bookmakers
+        :param grid: Odds of shape (matches, books, outcomes), NaN where missing
+        :param allowed: Mask of shape (books,) of the bookmakers that can be used
+        :return: Best odds (NaN if no allowed book offers the outcome) and the index of their book
+        """
+        n_matches, n_books, n_outcomes = grid.shape
+        if n_books == 0:
+            return np.full((n_matches, n_outcomes), np.nan), np.zeros(
+                (n_matches, n_outcomes), dtype=int
+            )
+        masked = np.where(allowed[None, :, None] & (grid > 0), grid, -np.inf)
+        best_book = np.argmax(masked, axis=1)
+        best_odds = np.take_along_axis(masked, best_book[:, None, :], axis=1)[:, 0, :]
+        best_odds[np.isneginf(best_odds)] = np.nan
+        return best_odds, best_book
+
+    @staticmethod
+    def apply_best_allowed_odds(
+        df: pd.DataFrame, grid: np.ndarray, books: List[str], excluded_books: List[str]
+    ) -> pd.DataFrame:
+        """
+        Replaces the best odds of the listing with the best odds of the allowed
+        bookmakers of the match pages. Matches with an outcome that only
+        excluded bookmakers offer are dropped
+        :param df: Dataframe containing scraped data, one row per match of the grid
+        :param grid: Odds of shape (matches, books, outcomes), NaN where missing
+        :param books: Bookmakers of the grid
+        :param excluded_books: Bookmakers that can not be used
+        :return: Dataframe with the best allowed odds and books
+        """
+        df = df.copy()
+        excluded = set(excluded_books)
+        allowed = np.array([book not in excluded for book in books], dtype=bool)
+        best_odds, best_book = Analyzer.get_best_allowed_odds(grid, allowed)
+        has_grid = ~np.isnan(grid).all(axis=(1, 2))[:, None]
+        listing_odds = df[ODDS_COLUMNS].to_numpy(dtype=float)
+        listing_allowed = ~df[BOOK_COLUMNS].isin(excluded).to_numpy()
+        odds = np.where(
+            has_grid, best_odds, np.where(listing_allowed, listing_odds, np.nan)
+        )
+        book_names = np.array(books + [None], dtype=object)[
+            np.where(np.isnan(best_odds), len(books), best_book)
+        ]
+        df[ODDS_COLUMNS] = odds
+        df[BOOK_COLUMNS] = np.where(
+            has_grid, book_names, df[BOOK_COLUMNS].to_numpy(dtype=object)
+        )
+        # a listed outcome nobody allowed offers can not be covered
+        covered = ~(np.isnan(odds) & ~np.isnan(listing_odds))
+        return df[covered.all(axis=1)]
+
+    @staticmethod
+    def check_positive_ev(
+        df: pd.DataFrame,
+        grid: np.ndarray,
+        books: List[str],
+        min_edge: float,
+        kelly_fraction: float,
+        bankroll: float,
+        sharp_books: Optional[List[str]] = None,
+        excluded_books: Optional[List[str]] = None,
+        min_books: int = 3,
+    ) -> pd.DataFrame:
+        """
+        Derives vig free fair probabilities from the consensus of all bookmakers
+        (or only the sharp ones if given) and flags the outcomes whose best allowed
+        odd beats the fair odd by at least min_edge, sized with a fractional kelly stake
+        :param df: Dataframe containing scraped data, one row per match of the grid
+        :param grid: Odds of shape (matches, books, outcomes), NaN where missing
+        :param books: Bookmakers of the grid
+        :param min_edge: Minimum expected return of a bet to be considered
+        :param kelly_fraction: Fraction of the kelly stake that should be invested
+        :param bankroll: Amount the kelly stake refers to
+        :param sharp_books: Bookmakers whose prices define the fair value, all if empty
+        :param excluded_books: Bookmakers that can not be used
+        :param min_books: Minium number of bookmakers needed for a consensus
+        :return: Dataframe with one row per positive ev outcome
+        """
+        listed = ~np.isnan(df[ODDS_COLUMNS].to_numpy(dtype=float))
+        implied = np.divide(1.0, grid, out=np.full_like(grid, np.nan), where=grid > 0)
+        # only books offering every outcome of the market have a known margin
+        complete = np.all(~np.isnan(implied) | ~listed[:, None, :], axis=2)
+        sharp = np.isin(books, sharp_books) if sharp_books else np.ones(len(books), dtype=bool)
+        used = complete & sharp[None, :]
+        implied = np.where(used[:, :, None] & listed[:, None, :], implied, 0.0)
+        margin = implied.sum(axis=2, keepdims=True)
+        fair_by_book = np.divide(
+            implied, margin, out=np.zeros_like(implied), where=margin > 0
+        )
+        n_books = used.sum(axis=1)
+        required = 1 if sharp_books else min_books
+        fair = np.divide(
+            fair_by_book.sum(axis=1),
+            n_books[:, None],
+            out=np.full(listed.shape, np.nan),
+            where=(n_books[:, None] >= max(required, 1)) & listed,
+        )
+
+        allowed = ~np.isin(books, excluded_books or [])
+        price, best_book = Analyzer.get_best_allowed_odds(grid, allowed)
+        with np.errstate(invalid="ignore"):
+            edge = price * fair - 1
+            positive = edge >= min_edge
+        # kelly: (b * p - q) / b with b = odds - 1, which is edge / (odds - 1)
+        kelly = np.divide(edge, price - 1, out=np.zeros_like(edge), where=positive & (price > 1))
+
+        rows, outcomes = np.nonzero(positive)
+        ev = df.iloc[rows][
+            ["date", "play_time", "sport", "sport_subdivision", "data_source", "team1", "team2"]
+            + (["scraped_at"] if "scraped_at" in df else [])
+        ].reset_index(drop=True)
+        ev["outcome"] = np.array([col.replace("_odds", "") for col in ODDS_COLUMNS])[outcomes]
+        ev["odds"] = price[rows, outcomes]
+        ev["book"] = np.array(books, dtype=object)[best_book[rows, outcomes]]
+        ev["fair_probability"] = np.round(fair[rows, outcomes], 4)
+        ev["fair_odds"] = np.round(1 / fair[rows, outcomes], 2)
+        ev["edge"] = np.round(edge[rows, outcomes], 5)
+        ev["kelly_stake"] = np.round(
+            np.clip(kelly[rows, outcomes], 0, 1) * kelly_fraction * bankroll,
+            INVEST_AMOUNT_DECIMALS,
+        )
+        return ev
@@ -0,0 +1,291 @@
+"""
+Local http/json api serving the latest analyzed matches and the open
+opportunities from an in-memory index, so other tools do not need to
+read the logs. Queries never trigger a scrape
+"""
+
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+
+from myodds.constants import BOOK_COLUMNS, BetType
+from myodds.model import to_records
+
+
+logger = logging.getLogger(__name__)
+
+Key = Tuple[Any, ...]
+# column the opportunities of a bet type are ranked by
+RANK_COLUMNS = {str(BetType.SURE_BET): "expected_win", str(BetType.POSITIVE_EV_BET): "edge"}
+
+
+def _to_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """
+    Rows of a dataframe as json serializable dictionaries
+    :param df: Dataframe
+    :return: List of records, NaN as None
+    """
+    return [
+        {
+            column: None if isinstance(value, float) and value != value else value
+            for column, value in record.items()
+        }
+        for record in to_records(df)
+    ]
+
+
+def _index_terms(record: Dict[str, Any]) -> Iterable[Tuple[str, str]]:
+    """
+    Filterable (field, value) pairs of a record
+    :param record: Match or opportunity
+    :return: Iterator of (sport|division|book, lower case value)
+    """
+    for field, column in (("sport", "sport"), ("division", "sport_subdivision")):
+        if record.get(column) is not None:
+            yield field, str(record[column]).lower()
+    for column in BOOK_COLUMNS + ["book"]:
+        if record.get(column) is not None:
+            yield "book", str(record[column]).lower()
+
+
+class OpportunityIndex:
+    """
+    Latest matches of every subdivision and the open opportunities of every
+    bet type. Opportunities are indexed by sport, subdivision and bookmaker
+    and ranked by expected win (edge for positive ev bets)
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialization of class
+        :return: None
+        """
+        self._lock = threading.Lock()
+        self._matches: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        # bet type -> key -> record
+        self._opportunities: Dict[str, Dict[Key, Dict[str, Any]]] = {}
+        # bet type -> (field, value) -> keys
+        self._terms: Dict[str, Dict[Tuple[str, str], Set[Key]]] = {}
+        # bet type -> keys by descending rank, None until the next query
+        self._ranked: Dict[str, Optional[List[Key]]] = {}
+
+    def set_matches(self, sport: str, division: str, df: pd.DataFrame) -> None:
+        """
+        Replaces the matches of a subdivision
+        :param sport: Sport that was scraped
+        :param division: Sub division of the sport
+        :param df: Dataframe containing scraped data
+        :return: None
+        """
+        records = _to_records(df)
+        with self._lock:
+            self._matches[(sport, division)] = records
+
+    def add(self, bet_type: BetType, df: pd.DataFrame, key_columns: List[str]) -> None:
+        """
+        Adds or updates opportunities
+        :param bet_type: Type of bet
+        :param df: Dataframe containing the opportunities
+        :param key_columns: Columns identifying an opportunity
+        :return: None
+        """
+        keys = list(df[key_columns].itertuples(index=False, name=None))
+        records = _to_records(df)
+        with self._lock:
+            self._remove(str(bet_type), keys)
+            opportunities = self._opportunities.setdefault(str(bet_type), {})
+            terms = self._terms.setdefault(str(bet_type), {})
+            for key, record in zip(keys, records):
+                opportunities[key] = record
+                for term in _index_terms(record):
+                    terms.setdefault(term, set()).add(key)
+            self._ranked[str(bet_type)] = None
+
+    def get(self, bet_type: BetType) -> Dict[Key, Dict[str, Any]]:
+        """
+        Open opportunities of a bet type
+        :param bet_type: Type of bet
+        :return: Dictionary of key to opportunity
+        """
+        with self._lock:
+            return dict(self._opportunities.get(str(bet_type), {}))
+
+    def remove(self, bet_type: BetType, keys: List[Key]) -> None:
+        """
+        Removes opportunities which closed
+        :param bet_type: Type of bet
+        :param keys: Keys of the opportunities
+        :return: None
+        """
+        with self._lock:
+            self._remove(str(bet_type), keys)
+
+    def _remove(self, bet_type: str, keys: List[Key]) -> None:
+        """
+        Removes opportunities, the lock must be held
+        :param bet_type: Type of bet
+        :param keys: Keys of the opportunities
+        :return: None
+        """
+        opportunities = self._opportunities.get(bet_type, {})
+        terms = self._terms.get(bet_type, {})
+        removed = False
+        for key in keys:
+            record = opportunities.pop(key, None)
+            if record is None:
+                continue
+            removed = True
+            for term in _index_terms(record):
+                term_keys = terms.get(term)
+                if term_keys is not None:
+                    term_keys.discard(key)
+                    if not term_keys:
+                        del terms[term]
+        if removed:
+            self._ranked[bet_type] = None
+
+    def opportunities(
+        self,
+        bet_type: str,
+        filters: Dict[str, str],
+        min_value: Optional[float] = None,
+        top: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Open opportunities of a bet type, best first
+        :param bet_type: Type of bet (sure_bet or positive_ev_bet)
+        :param filters: Values of sport, division and book to match
+        :param min_value: Minimum expected win (edge for positive ev bets)
+        :param top: Maximum number of opportunities
+        :return: List of opportunities
+        """
+        column = RANK_COLUMNS.get(bet_type, "expected_win")
+        with self._lock:
+            opportunities = self._opportunities.get(bet_type, {})
+            ranked = self._ranked.get(bet_type)
+            if ranked is None:
+                ranked = sorted(
+                    opportunities,
+                    key=lambda key: opportunities[key].get(column) or 0,
+                    reverse=True,
+                )
+                self._ranked[bet_type] = ranked
+            candidates: Optional[Set[Key]] = None
+            terms = self._terms.get(bet_type, {})
+            for field, value in filters.items():
+                keys = terms.get((field, value.lower()), set())
+                candidates = keys if candidates is None else candidates & keys
+            results = []
+            for key in ranked:
+                if top is not None and len(results) >= top:
+                    break
+                if candidates is not None and key not in candidates:
+                    continue
+                record = opportunities[key]
+                if min_value is not None and (record.get(column) or 0) < min_value:
+                    # ranked descending, nothing better follows
+                    break
+                results.append(record)
+        return results
+
+    def matches(
+        self, filters: Dict[str, str], top: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Latest matches of all subdivisions
+        :param filters: Values of sport, division and book to match
+        :param top: Maximum number of matches
+        :return: List of matches
+        """
+        wanted = {(field, value.lower()) for field, value in filters.items()}
+        results = []
+        with self._lock:
+            for records in self._matches.values():
+                for record in records:
+                    if top is not None and len(results) >= top:
+                        return results
+                    terms = set(_index_terms(record))
+                    if wanted <= terms:
+                        results.append(record)
+        return results
+
+
+class _ApiHandler(BaseHTTPRequestHandler):
+    """
+    Serves /matches and /opportunities as json
+    """
+
+    server: "ApiServer"
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        filters = {
+            field: query[field] for field in ("sport", "division", "book") if field in query
+        }
+        try:
+            top = int(query["top"]) if "top" in query else None
+            min_value = float(query["min_value"]) if "min_value" in query else None
+        except ValueError:
+            self._send(400, {"error": "top must be an integer and min_value a number"})
+            return
+        index = self.server.index
+        if url.path == "/opportunities":
+            bet_type = query.get("type", str(BetType.SURE_BET))
+            results = index.opportunities(bet_type, filters, min_value, top)
+        elif url.path == "/matches":
+            results = index.matches(filters, top)
+        else:
+            self._send(404, {"error": "use /matches or /opportunities"})
+            return
+        self._send(200, {"count": len(results), "results": results})
+
+    def _send(self, status: int, body: Dict[str, Any]) -> None:
+        """
+        Sends a json response
+        :param status: Http status
+        :param body: Json body
+        :return: None
+        """
+        data = json.dumps(body, default=str).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug(format % args)
+
+
+class ApiServer(ThreadingHTTPServer):
+    """
+    Http server with the index its handlers query
+    """
+
+    def __init__(self, address: Tuple[str, int], index: OpportunityIndex) -> None:
+        super().__init__(address, _ApiHandler)
+        self.index = index
+
+
+def start_server(config: Dict[str, Any], index: OpportunityIndex) -> Optional[ApiServer]:
+    """
+    Starts the api in a background thread if it is enabled
+    :param config: Configuration dictionary
+    :param index: Index to serve
+    :return: Running server or None if it is disabled
+    """
+    api_config = config.get("api", {})
+    if not api_config.get("enabled", False):
+        return None
+    host = api_config.get("host", "127.0.0.1")
+    port = int(api_config.get("port", 9109))
+    server = ApiServer((host, port), index)
+    threading.Thread(target=server.serve_forever, name="api", daemon=True).start()
+    logger.info(f"Serving the api on http://{host}:{port}")
+    return server
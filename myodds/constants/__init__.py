@@ -1,12 +1,25 @@
 from myodds.constants.bot import (
     BetType,
+    BOOK_COLUMNS,
     COLUMNS,
     INVEST_AMOUNT_DECIMALS,
+    INVEST_PERCENTAGE_COLUMNS,
+    INVEST_PERCENTAGE_DECIMALS,
+    INVEST_SEARCH_BUFFER_SIZE,
+    INVEST_SEARCH_STEP,
+    INVEST_VALUE_COLUMNS,
+    MATCH_KEY_COLUMNS,
+    ODDS_COLUMNS,
     REFRESH_TIME_SECONDS,
 )
 from myodds.constants.site import (
     DAY,
     DAYDATE,
+    GRID_BOOK_ATTRIBUTE,
+    GRID_CELL,
+    GRID_HEADER,
+    GRID_ODDS_ATTRIBUTE,
+    GRID_ROW,
     ODDS,
     PLAY_TIME,
     SPORT_INFO,
@@ -20,6 +20,12 @@ class BetType(str, Enum):
 
 REFRESH_TIME_SECONDS = 300
 INVEST_AMOUNT_DECIMALS = 1
+# Decimals the invest percentages of a sure bet are rounded to
+INVEST_PERCENTAGE_DECIMALS = 4
+# Step between the total amounts tried when searching credible invest values
+INVEST_SEARCH_STEP = 0.01
+# Approximate number of totals tried at once during that search
+INVEST_SEARCH_BUFFER_SIZE = 10_000
 
 COLUMNS = [
     "date",
@@ -38,6 +44,19 @@ COLUMNS = [
     "reciprocal",
     "is_sure_bet",
     "expected_win",
-    "invest_percentages",
-    "invest_values",
+    "home_invest_percentage",
+    "draw_invest_percentage",
+    "away_invest_percentage",
+    "home_invest_value",
+    "draw_invest_value",
+    "away_invest_value",
+    "match_url",
+    "scraped_at",
 ]
+
+ODDS_COLUMNS = [col for col in COLUMNS if "odds" in col]
+BOOK_COLUMNS = [col for col in COLUMNS if "book" in col]
+INVEST_PERCENTAGE_COLUMNS = [col for col in COLUMNS if "invest_percentage" in col]
+INVEST_VALUE_COLUMNS = [col for col in COLUMNS if "invest_value" in col]
+# Identifies a match across cycles
+MATCH_KEY_COLUMNS = ["sport", "sport_subdivision", "team1", "team2", "date"]
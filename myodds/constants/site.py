@@ -9,6 +9,14 @@ PLAY_TIME = "_1ob6_g"
 TEAMS = "_2tehgH"
 ODDS = "_1X_OAJ"
 
+# Odds table of a match page, one row per outcome and one cell per bookmaker
+GRID_ROW = "tr.diff-row"
+# header cell of a bookmaker, whose logo carries the name the listing uses
+GRID_HEADER = "tr.eventTableHeader td[data-bk]"
+GRID_CELL = "td[data-bk]"
+GRID_BOOK_ATTRIBUTE = "data-bk"
+GRID_ODDS_ATTRIBUTE = "data-odig"
+
 SPORTS = {
     "football": {
         "Seria-A": "https://www.oddschecker.com/it/calcio/italia/serie-a",
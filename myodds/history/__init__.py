@@ -0,0 +1 @@
+from myodds.history.history import HistoryStore
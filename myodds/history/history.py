@@ -0,0 +1,167 @@
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from myodds.constants import COLUMNS
+
+
+logger = logging.getLogger(__name__)
+
+# Columns filled by the scraper, the analysis columns are not stored
+SCRAPED_COLUMNS = COLUMNS[: COLUMNS.index("reciprocal")]
+REAL_COLUMNS = {"home_odds", "draw_odds", "away_odds"}
+
+
+class HistoryStore:
+    """
+    Append only history of every scraped row, stored in SQLite (WAL mode)
+    so thresholds can be backtested. Rows are written in batches by a
+    background thread, so appending never blocks scraping
+    """
+
+    def __init__(self, config: Dict[str, Any]) -> None:
+        """
+        Initialization of class, creates the database if needed
+        :param config: Configuration dictionary
+        :return: None
+        """
+        history_config = config.get("history", {})
+        self._path = history_config.get("path", "history.sqlite")
+        self._batch_size = int(history_config.get("batch_size", 50))
+        self._create()
+        # (scraped_at, dataframe), None stops the writer
+        self._queue: "queue.Queue[Optional[Tuple[float, pd.DataFrame]]]" = queue.Queue()
+        self._writer = threading.Thread(
+            target=self._write, name="history-writer", daemon=True
+        )
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Opens a connection to the database
+        :return: Connection
+        """
+        connection = sqlite3.connect(self._path, timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _create(self) -> None:
+        """
+        Creates the table and indexes if they do not exist
+        :return: None
+        """
+        columns = ", ".join(
+            f"{col} REAL" if col in REAL_COLUMNS else f"{col} TEXT COLLATE NOCASE"
+            for col in SCRAPED_COLUMNS
+        )
+        with self._connect() as connection:
+            connection.execute(
+                f"CREATE TABLE IF NOT EXISTS odds (scraped_at REAL NOT NULL, {columns})"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS odds_scraped_at ON odds (scraped_at)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS odds_sport ON odds (sport, scraped_at)"
+            )
+        connection.close()
+
+    def append(self, df: pd.DataFrame, scraped_at: Optional[float] = None) -> None:
+        """
+        Queues the scraped rows of a cycle to be written
+        :param df: Dataframe containing scraped data
+        :param scraped_at: Unix time of the scrape, defaults to the
+            scraped_at column or now
+        :return: None
+        """
+        if df.empty:
+            return
+        if scraped_at is None and "scraped_at" in df and df["scraped_at"].notna().any():
+            scraped_at = float(df["scraped_at"].max())
+        self._queue.put((scraped_at or time.time(), df))
+
+    def close(self) -> None:
+        """
+        Writes the queued rows and stops the writer
+        :return: None
+        """
+        self._queue.put(None)
+        self._writer.join(timeout=30)
+
+    def _write(self) -> None:
+        """
+        Writer thread, inserts everything that is queued in one transaction
+        :return: None
+        """
+        connection = self._connect()
+        placeholders = ", ".join("?" for _ in range(len(SCRAPED_COLUMNS) + 1))
+        insert = (
+            f"INSERT INTO odds (scraped_at, {', '.join(SCRAPED_COLUMNS)}) "
+            f"VALUES ({placeholders})"
+        )
+        running = True
+        while running:
+            item = self._queue.get()
+            batch: List[Tuple[float, pd.DataFrame]] = []
+            while item is not None:
+                batch.append(item)
+                if len(batch) >= self._batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            running = item is not None
+            rows = [
+                (scraped_at, *row)
+                for scraped_at, df in batch
+                for row in df[SCRAPED_COLUMNS]
+                .astype(object)
+                .where(df[SCRAPED_COLUMNS].notna(), None)
+                .itertuples(index=False, name=None)
+            ]
+            try:
+                with connection:
+                    connection.executemany(insert, rows)
+            except sqlite3.Error as e:
+                logger.warning(f"Could not write {len(rows)} rows to history. Exception {e}")
+        connection.close()
+
+    def load(
+        self,
+        start: datetime,
+        end: datetime,
+        sport: Optional[str] = None,
+        division: Optional[str] = None,
+    ) -> pd.DataFrame:
+        """
+        Loads the rows scraped in a time range, only reading the
+        matching part of the history
+        :param start: Start of the range (inclusive)
+        :param end: End of the range (exclusive)
+        :param sport: Only rows of this sport
+        :param division: Only rows of this sub division
+        :return: Dataframe with scraped_at as UTC datetime and the scraped columns
+        """
+        query = "SELECT * FROM odds WHERE scraped_at >= ? AND scraped_at < ?"
+        params: List[Any] = [start.timestamp(), end.timestamp()]
+        if sport is not None:
+            query += " AND sport = ?"
+            params.append(sport)
+        if division is not None:
+            query += " AND sport_subdivision = ?"
+            params.append(division)
+        connection = self._connect()
+        try:
+            df = pd.read_sql_query(query + " ORDER BY scraped_at", connection, params=params)
+        finally:
+            connection.close()
+        df["scraped_at"] = pd.to_datetime(df["scraped_at"], unit="s", utc=True)
+        return df
@@ -3,11 +3,11 @@
 Main myodds script
 """
 
+import argparse
 import logging
-from datetime import datetime
+from typing import List, Optional
 
-from myodds.constants import REFRESH_TIME_SECONDS
-from myodds.myoddsbot import MyOddsBot
+from myodds import __version__
 from myodds.utils import load_config
 
 logger = logging.getLogger("myodds")
@@ -15,25 +15,54 @@ LOGFORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 logging.basicConfig(level=logging.INFO, format=LOGFORMAT)
 
 
-def main() -> None:
+def parse_args(args: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+    Parses the command line arguments
+    :param args: Arguments, sys.argv if None
+    :return: Parsed arguments
+    """
+    parser = argparse.ArgumentParser(prog="myodds", description="MyOdds - Sure Bet Finder")
+    parser.add_argument(
+        "--once",
+        action="store_true",
+        help="scrape and analyze every division once and exit",
+    )
+    parser.add_argument("--version", action="version", version=f"myodds {__version__}")
+    return parser.parse_args(args)
+
+
+def main(args: Optional[List[str]] = None) -> None:
+    arguments = parse_args(args)
     logger.info("Starting myodds..")
 
     config = load_config()
+    # pandas, playwright and telegram are only imported once the bot is needed
+    from myodds.myoddsbot import MyOddsBot
+
     myoddsbot = MyOddsBot(config=config)
 
-    myoddsbot.runner()
-    time = datetime.now()
-    run_time = datetime.now()
-    while True:
-        delta = datetime.now() - time
-        run_delta = datetime.now() - run_time
-        if delta.seconds >= 60:
-            logger.info(f"Bot is running")
-            if run_delta.seconds >= REFRESH_TIME_SECONDS:
-                logger.info("Scraping now..")
-                myoddsbot.runner()
-                run_time = datetime.now()
-            time = datetime.now()
+    if arguments.once:
+        try:
+            myoddsbot.runner()
+        finally:
+            myoddsbot.stop()
+        return
+
+    if config.get("workers", {}).get("enabled", False):
+        from myodds.workers import Coordinator
+
+        coordinator = Coordinator(myoddsbot, config)
+        try:
+            coordinator.run()
+        finally:
+            coordinator.stop()
+            myoddsbot.stop()
+        return
+
+    try:
+        myoddsbot.run_forever()
+    finally:
+        myoddsbot.stop()
 
 
 if __name__ == "__main__":
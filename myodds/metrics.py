@@ -0,0 +1,283 @@
+"""
+Instrumentation of the scrape/analyze/notify pipeline, exposed in the
+Prometheus text format on a local http endpoint
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, float("inf"))
+
+
+def _escape(value: str) -> str:
+    """
+    Escapes a label value
+    :param value: Label value
+    :return: Escaped label value
+    """
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    """
+    Formats label names and values as {name="value",..}
+    :param names: Label names
+    :param values: Label values
+    :param extra: Already formatted extra label (e.g. le="0.1")
+    :return: Formatted labels, empty string if there are none
+    """
+    labels = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        labels.append(extra)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+class Metric:
+    """
+    Base class of the metrics, keeps the values per label combination
+    """
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()) -> None:
+        """
+        Initialization of class, registers the metric
+        :param name: Metric name
+        :param documentation: Help text
+        :param labels: Label names
+        :return: None
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        """
+        Label values in the order of the label names
+        :param labels: Label values by name
+        :return: Tuple of label values
+        """
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def render(self) -> List[str]:
+        """
+        Lines of the metric in the Prometheus text format
+        :return: List of lines
+        """
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    """
+    Value that only goes up
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        if not self.labels:
+            self._values[()] = 0
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        """
+        Increases the counter
+        :param amount: Amount to add
+        :param labels: Label values
+        :return: None
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram(Metric):
+    """
+    Distribution of observed values in cumulative buckets
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labels)
+        self._buckets = tuple(sorted(buckets))
+        if self._buckets[-1] != float("inf"):
+            self._buckets += (float("inf"),)
+        # label values -> (bucket counts, sum)
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], float]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        """
+        Adds an observation
+        :param value: Observed value
+        :param labels: Label values
+        :return: None
+        """
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self._buckets), 0.0))
+            for i, bound in enumerate(self._buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        """
+        Observes the duration of the block in seconds
+        :param labels: Label values
+        :return: Iterator
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, (counts, total) in self._values.items():
+                for bound, count in zip(self._buckets, counts):
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    labels = _format_labels(self.labels, key, f'le="{le}"')
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _format_labels(self.labels, key)
+                lines.append(f"{self.name}_sum{labels} {total}")
+                lines.append(f"{self.name}_count{labels} {counts[-1]}")
+        return lines
+
+
+REGISTRY: List[Metric] = []
+
+STAGE_SECONDS = Histogram(
+    "myodds_stage_seconds",
+    "Duration of a pipeline stage per division",
+    ["stage", "division"],
+)
+CYCLE_SECONDS = Histogram(
+    "myodds_cycle_seconds", "Duration of a scrape/analyze/notify cycle"
+)
+SCROLLS = Histogram(
+    "myodds_scrolls",
+    "Scrolls needed until all matches of a division page were loaded",
+    ["division"],
+    buckets=(1, 2, 3, 5, 7, 10, 15, 20, 30, float("inf")),
+)
+PAGES = Counter(
+    "myodds_pages_total",
+    "Division pages scraped, by whether their odds changed since the last cycle",
+    ["division", "result"],
+)
+API_CAPTURES = Counter(
+    "myodds_api_captures_total",
+    "Division pages read from the odds api payloads or scraped as fallback",
+    ["division", "result"],
+)
+SCRAPED_MATCHES = Counter(
+    "myodds_scraped_matches_total", "Matches scraped per division", ["division"]
+)
+SKIPPED_ENTRIES = Counter(
+    "myodds_skipped_entries_total",
+    "Scraped entries skipped because they could not be parsed",
+    ["division"],
+)
+SURE_BETS = Counter("myodds_sure_bets_total", "Sure bets found per division", ["division"])
+SCRAPE_FAILURES = Counter(
+    "myodds_scrape_failures_total", "Divisions that could not be scraped", ["division"]
+)
+STALE_OPPORTUNITIES = Counter(
+    "myodds_stale_opportunities_total",
+    "Opportunities dropped because their odds were older than the ttl",
+    ["bet_type"],
+)
+ALERT_LATENCY_SECONDS = Histogram(
+    "myodds_alert_latency_seconds",
+    "Time from scraping the odds to delivering their telegram message",
+    buckets=(1, 2, 5, 10, 20, 30, 60, 120, 300, 600, float("inf")),
+)
+SCRAPE_RETRIES = Counter(
+    "myodds_scrape_retries_total", "Retried scrapes of a division page", ["division"]
+)
+CIRCUIT_OPEN = Counter(
+    "myodds_circuit_open_total",
+    "Scrapes skipped because the page of the division failed repeatedly",
+    ["division"],
+)
+BROWSER_FAILURES = Counter(
+    "myodds_browser_failures_total", "Times the browser could not be started"
+)
+
+
+def render() -> str:
+    """
+    All registered metrics in the Prometheus text format
+    :return: Metrics as text
+    """
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """
+    Serves the metrics on /metrics
+    """
+
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug(format % args)
+
+
+def start_server(config: Dict[str, Any]) -> Optional[ThreadingHTTPServer]:
+    """
+    Starts the metrics endpoint in a background thread if it is enabled
+    :param config: Configuration dictionary
+    :return: Running server or None if it is disabled
+    """
+    metrics_config = config.get("metrics", {})
+    if not metrics_config.get("enabled", False):
+        return None
+    host = metrics_config.get("host", "127.0.0.1")
+    port = int(metrics_config.get("port", 9108))
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        logger.warning(
+            f"Could not serve metrics on {host}:{port} ({e}). Continuing without metrics"
+        )
+        return None
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,109 @@
+import sys
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from myodds.constants import (
+    COLUMNS,
+    INVEST_PERCENTAGE_COLUMNS,
+    INVEST_VALUE_COLUMNS,
+    ODDS_COLUMNS,
+)
+
+
+# scraped columns besides the odds, up to the first column of the analysis
+STRING_COLUMNS = [
+    column
+    for column in COLUMNS[: COLUMNS.index("reciprocal")] + ["match_url"]
+    if column not in ODDS_COLUMNS
+]
+
+
+# list of the outcomes of a record and the invest columns it is built from
+INVEST_LISTS = {
+    "invest_percentages": INVEST_PERCENTAGE_COLUMNS,
+    "invest_values": INVEST_VALUE_COLUMNS,
+}
+
+
+def to_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """
+    Rows of a dataframe as dictionaries for the messages and the api. The
+    invest columns of the outcomes become the invest_percentages and
+    invest_values lists, None if the match has none
+    :param df: Dataframe
+    :return: List of records
+    """
+    lists = {
+        name: columns for name, columns in INVEST_LISTS.items() if set(columns) <= set(df.columns)
+    }
+    invest_columns = [column for columns in lists.values() for column in columns]
+    records = df.drop(columns=invest_columns).to_dict("records")
+    for name, columns in lists.items():
+        values = df[columns].to_numpy(dtype=float)
+        missing = np.isnan(values).all(axis=1)
+        for record, row, is_missing in zip(records, values.tolist(), missing):
+            record[name] = None if is_missing else row
+    return records
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    """
+    Interns a scraped string, so equal teams, books, dates and urls
+    share one object across matches and cycles
+    :param value: Scraped string or None
+    :return: Interned string or None
+    """
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class MatchTable:
+    """
+    Columnar table of the scraped matches of a page. Strings are interned and
+    the odds are collected in one flat float buffer, so no record per match
+    is kept while a page is parsed. It only lives inside build_matches: the
+    snapshots, the analyzer, the history, the api and the workers all work on
+    the dataframe built once by to_frame
+    """
+
+    __slots__ = ("_strings", "_odds")
+
+    def __init__(self) -> None:
+        """
+        Initialization of class
+        :return: None
+        """
+        self._strings: Dict[str, List[Optional[str]]] = {
+            column: [] for column in STRING_COLUMNS
+        }
+        self._odds: List[float] = []
+
+    def __len__(self) -> int:
+        return len(self._odds) // len(ODDS_COLUMNS)
+
+    def append(self, record: Dict[str, Any]) -> None:
+        """
+        Adds a match
+        :param record: Scraped data of the match as returned by get_3_way_data
+        :return: None
+        """
+        for column, values in self._strings.items():
+            values.append(_intern(record.get(column)))
+        self._odds.extend(record[column] for column in ODDS_COLUMNS)
+
+    def to_frame(self, scraped_at: Optional[float] = None) -> pd.DataFrame:
+        """
+        Dataframe of the matches with all COLUMNS, the analysis columns are empty
+        :param scraped_at: Unix time the matches were scraped
+        :return: Dataframe with scraped data
+        """
+        odds = np.array(self._odds, dtype=float).reshape(-1, len(ODDS_COLUMNS))
+        data: Dict[str, Any] = dict(self._strings)
+        data.update({column: odds[:, i] for i, column in enumerate(ODDS_COLUMNS)})
+        empty = np.full(len(odds), np.nan)
+        if scraped_at is not None:
+            data["scraped_at"] = np.full(len(odds), scraped_at)
+        return pd.DataFrame(
+            {column: data.get(column, empty) for column in COLUMNS}, columns=COLUMNS
+        )
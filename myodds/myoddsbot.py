@@ -1,16 +1,42 @@
+import asyncio
 import logging
-from typing import Any, Dict
+import time
+from typing import Any, Dict, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 
 from myodds.analyzer import Analyzer
-from myodds.constants import BetType, SPORTS
+from myodds.api import OpportunityIndex
+from myodds.api import start_server as start_api_server
+from myodds.constants import (
+    BetType,
+    BOOK_COLUMNS,
+    INVEST_VALUE_COLUMNS,
+    MATCH_KEY_COLUMNS,
+    ODDS_COLUMNS,
+    SPORTS,
+)
+from myodds.history import HistoryStore
+from myodds.metrics import (
+    BROWSER_FAILURES,
+    STAGE_SECONDS,
+    STALE_OPPORTUNITIES,
+    SURE_BETS,
+    start_server,
+)
+from myodds.model import to_records
+from myodds.scheduler import DivisionHandler, Scheduler
 from myodds.scraper import Scraper
-from myodds.rpc import Telegram
+from myodds.snapshot import SnapshotStore
+from myodds.utils import get_divisions
 
 
 logger = logging.getLogger(__name__)
 
+# odds of every match, bookmaker and outcome and the bookmakers of the columns
+OddsGrid = Tuple[np.ndarray, List[str]]
+
 
 class MyOddsBot:
     """
@@ -25,61 +51,394 @@ class MyOddsBot:
         :return: None
         """
         self._config = config
+        # one loop for the lifetime of the bot, so the browser pool survives between cycles
+        self._loop = asyncio.new_event_loop()
         self.scraper = Scraper(self._config)
+        self.snapshots = SnapshotStore(self._config)
+        self._ttl = float(self._config.get("freshness", {}).get("ttl_seconds", 120))
+        self._allocation = self._config.get("allocation", {})
+        positive_ev = self._config.get("positive_ev", {}).get("enabled", False)
+        deep_mode = self._config.get("deep_mode", {}).get("enabled", False)
+        if positive_ev and not deep_mode:
+            # the positive ev check only runs on the odds grid of the match pages
+            logger.warning(
+                "positive_ev needs the odds of every bookmaker from deep_mode, "
+                "enable deep_mode.enabled to check for positive ev bets"
+            )
+        # fresh sure bets of the current cycle, waiting to be staked together
+        self._cycle_sure_bets: List[pd.DataFrame] = []
+        self.history: Optional[HistoryStore] = None
+        if self._config.get("history", {}).get("enabled", False):
+            self.history = HistoryStore(self._config)
 
         if self._config["telegram"]["enabled"]:
+            from myodds.rpc import Telegram
+
             self.telegram = Telegram(self._config)
+        self._metrics_server = start_server(self._config)
+        self.index = OpportunityIndex()
+        self._api_server = start_api_server(self._config, self.index)
 
-    def process(self, sport, division, url) -> None:
+    def process(self, sport: str, division: str, df: pd.DataFrame) -> None:
         """
-        Main process scrapes the data for a given sport and subdivision and checks
-        if there there is a opportunity
+        Main process checks if there is a opportunity in the new or
+        changed matches of the scraped data of a given sport and subdivision
+        :param sport: Sport that was scraped
+        :param division: Sub division of the sport
+        :param df: Dataframe containing scraped data
         :return: None
         """
-        df = self.scraper.get_matches(sport, division, url)
-
+        self.index.set_matches(sport, division, df)
+        df, removed = self.snapshots.diff(sport, division, df)
+        # positive ev bets are kept per outcome of a match
+        removed_outcomes = [
+            (*key, col.replace("_odds", "")) for key in removed for col in ODDS_COLUMNS
+        ]
+        self.snapshots.forget(removed + removed_outcomes)
+        self.index.remove(BetType.SURE_BET, removed)
+        self.index.remove(BetType.POSITIVE_EV_BET, removed_outcomes)
+        if df.empty:
+            logger.info(f"No odds changed for {sport}: {division}")
+            return
         # check for surebet
         if self._config["check_sure_bet"]:
-            self.check_sure_bet(df)
+            self.check_sure_bet(df, division)
 
     def runner(self) -> None:
         """
-        Main loop goes over all sports and subdivision
-        Checks if a proxy is used
+        Runs a single pass over all sports and subdivision
+        :return: None
+        """
+        self._loop.run_until_complete(self.run_divisions(get_divisions(SPORTS)))
+
+    def run_forever(
+        self,
+        divisions: Optional[List[Tuple[str, str, str]]] = None,
+        handler: Optional[DivisionHandler] = None,
+    ) -> None:
+        """
+        Keeps scraping every subdivision whenever its refresh interval is due
+        :param divisions: List of (sport, subdivision, url) to scrape, all of SPORTS if None
+        :param handler: Coroutine handling the due subdivisions, run_divisions if None
+        :return: None
+        """
+        self.listen()
+        scheduler = Scheduler(self._config, handler or self.run_divisions)
+        for division in divisions if divisions is not None else get_divisions(SPORTS):
+            scheduler.add(division)
+        self._loop.run_until_complete(scheduler.run())
+
+    def listen(self) -> None:
+        """
+        Starts listening for telegram commands, only needed while the bot keeps running
         :return: None
         """
+        if self._config["telegram"]["enabled"]:
+            self.telegram.start_polling()
+
+    def stop(self) -> None:
+        """
+        Closes the browser which stays open between cycles
+        and flushes the queued telegram messages and history rows
+        :return: None
+        """
+        self._loop.run_until_complete(self.scraper._stop_browser())
+        self._loop.close()
+        if self._config["telegram"]["enabled"]:
+            self.telegram.stop()
+        if self.history is not None:
+            self.history.close()
+        if self._metrics_server is not None:
+            self._metrics_server.shutdown()
+        if self._api_server is not None:
+            self._api_server.shutdown()
+
+    async def run_divisions(
+        self, divisions: List[Tuple[str, str, str]]
+    ) -> Dict[Tuple[str, str], pd.DataFrame]:
+        """
+        Scrapes the given sports and subdivisions concurrently and
+        processes the data of every subdivision
+        :param divisions: List of (sport, subdivision, url) to scrape
+        :return: Dictionary with the scraped dataframe of every (sport, subdivision)
+        """
+        matches, odds_grid = await self.scrape_divisions(divisions)
+        return self.analyze(matches, odds_grid)
+
+    async def scrape_divisions(
+        self, divisions: List[Tuple[str, str, str]]
+    ) -> Tuple[Dict[Tuple[str, str], pd.DataFrame], Optional[OddsGrid]]:
+        """
+        Scrapes the given sports and subdivisions concurrently and, in deep
+        mode, the odds of every bookmaker from the match pages
+        :param divisions: List of (sport, subdivision, url) to scrape
+        :return: Dictionary with the scraped dataframe of every (sport, subdivision)
+            and the odds grid of all matches in the order of the dictionary,
+            None if deep mode is disabled
+        """
         try:
-            self.scraper._get_browser_page()
+            await self.scraper._get_browser_page()
         except:
+            BROWSER_FAILURES.inc()
             logger.warning("Could not create browser. Waiting for next iteration")
-            self.scraper._stop_browser()
-            return
-        for sport, subdivision in SPORTS.items():
-            for division, url in subdivision.items():
-                try:
-                    self.process(sport, division, url)
-                except:
-                    logger.warning(
-                        f"Could not process data for {sport}: {division}. Going to next.."
-                    )
-        self.scraper._stop_browser()
-
-    def check_sure_bet(self, df: pd.DataFrame) -> None:
+            await self.scraper._stop_browser()
+            return {}, None
+        matches = await self.scraper.get_all_matches(divisions)
+        odds_grid = None
+        deep_mode = self._config.get("deep_mode", {})
+        if deep_mode.get("enabled", False) and matches:
+            combined = pd.concat(list(matches.values()), ignore_index=True)
+            grids = await self.scraper.get_odds_grids(combined["match_url"].tolist())
+            odds_grid = Analyzer.build_odds_grid(grids, deep_mode.get("book_names", {}))
+        return matches, odds_grid
+
+    def analyze(
+        self,
+        matches: Dict[Tuple[str, str], pd.DataFrame],
+        odds_grid: Optional[OddsGrid] = None,
+    ) -> Dict[Tuple[str, str], pd.DataFrame]:
+        """
+        Stores the scraped data and processes the data of every subdivision
+        :param matches: Dictionary with the scraped dataframe of every (sport, subdivision)
+        :param odds_grid: Odds grid of all matches from scrape_divisions, None if not in deep mode
+        :return: Dictionary with the processed dataframe of every (sport, subdivision)
+        """
+        if self.history is not None:
+            for df in matches.values():
+                self.history.append(df)
+        unchanged = {key for key, df in matches.items() if df.attrs.get("unchanged")}
+        if odds_grid is not None:
+            matches = self.get_deep_odds(matches, *odds_grid)
+            # the other bookmakers of the match pages may have changed their odds
+            unchanged = set()
+        for (sport, division), df in matches.items():
+            if (sport, division) in unchanged and self.snapshots.has(sport, division):
+                logger.info(f"No odds changed for {sport}: {division}")
+                continue
+            try:
+                self.process(sport, division, df)
+            except:
+                logger.warning(
+                    f"Could not process data for {sport}: {division}. Going to next.."
+                )
+        try:
+            self.allocate_sure_bets()
+        except:
+            self._cycle_sure_bets = []
+            logger.warning("Could not allocate the stakes of the sure bets. Going to next..")
+        return matches
+
+    def get_deep_odds(
+        self,
+        matches: Dict[Tuple[str, str], pd.DataFrame],
+        grid: np.ndarray,
+        books: List[str],
+    ) -> Dict[Tuple[str, str], pd.DataFrame]:
+        """
+        Checks the odds of every bookmaker of all subdivisions at once for
+        positive ev bets and uses the best odds of the bookmakers that are not excluded
+        :param matches: Dictionary with the scraped dataframe of every (sport, subdivision)
+        :param grid: Odds of every match, bookmaker and outcome in the order of matches
+        :param books: Bookmakers of the grid columns
+        :return: Dictionary with the dataframes with the best allowed odds and books
+        """
+        if not matches:
+            return matches
+        frames = list(matches.values())
+        combined = pd.concat(frames, ignore_index=True)
+        excluded = self._config["deep_mode"].get("excluded_books", [])
+        if self._config.get("positive_ev", {}).get("enabled", False):
+            try:
+                self.check_positive_ev(combined, grid, books, excluded)
+            except:
+                logger.warning("Could not check for positive ev bets. Going to next..")
+        offsets = np.cumsum([0] + [len(frame) for frame in frames])
+        return {
+            key: Analyzer.apply_best_allowed_odds(
+                frame, grid[offsets[i] : offsets[i + 1]], books, excluded
+            )
+            for i, (key, frame) in enumerate(matches.items())
+        }
+
+    def check_sure_bet(self, df: pd.DataFrame, division: str = "") -> None:
         """
         Check if there is a sure bet opportunity and calculates
         proposed bet amount
         :param df: Dataframe containing scraped data
+        :param division: Sub division of the data, used for the metrics
         :return: None
         """
-        df = Analyzer.check_is_sure_bet(df, self._config["min_win_perc"])
-        df = Analyzer.get_credible_values(
-            df, self._config["min_bet"], self._config["max_bet"]
-        )
+        with STAGE_SECONDS.time(stage="analyze", division=division):
+            df = Analyzer.check_is_sure_bet(df, self._config["min_win_perc"])
+            closed = df[df["is_sure_bet"] == False]
+            closed_keys = list(closed[MATCH_KEY_COLUMNS].itertuples(index=False, name=None))
+            self.snapshots.forget(closed_keys)
+            self.index.remove(BetType.SURE_BET, closed_keys)
+            df = Analyzer.get_credible_values(
+                df, self._config["min_bet"], self._config["max_bet"]
+            )
         if df.empty:
             logger.info("No sure bet found. Waiting for next iteration")
             return
+        SURE_BETS.inc(len(df), division=division)
         logger.debug(df)
-        self.prepare_send_message(df, BetType.SURE_BET)
+        df = self.drop_stale(df, BetType.SURE_BET)
+        if df.empty:
+            return
+        if self._allocation.get("enabled", False):
+            # staked together with the sure bets of the other subdivisions by allocate_sure_bets
+            self._cycle_sure_bets.append(df)
+            return
+        self.notify_sure_bets(df, division)
+
+    def allocate_sure_bets(self) -> None:
+        """
+        Splits what is left of the bankroll and the bookmaker balances over the
+        sure bets of all subdivisions of the cycle which should be notified.
+        The stakes recommended for sure bets which are still open stay reserved
+        :return: None
+        """
+        if not self._cycle_sure_bets:
+            return
+        df = pd.concat(self._cycle_sure_bets, ignore_index=True)
+        self._cycle_sure_bets = []
+        notify = self.snapshots.filter_notifications(df)
+        kept = df.drop(index=notify.index)
+        open_bets = self.index.get(BetType.SURE_BET)
+        if not kept.empty:
+            # not notified again, so their last recommended stakes still apply
+            kept_keys = kept[MATCH_KEY_COLUMNS].itertuples(index=False, name=None)
+            kept[INVEST_VALUE_COLUMNS] = [
+                open_bets[key]["invest_values"] if key in open_bets else invest
+                for key, invest in zip(kept_keys, kept[INVEST_VALUE_COLUMNS].to_numpy())
+            ]
+            self.index.add(BetType.SURE_BET, kept, MATCH_KEY_COLUMNS)
+        if notify.empty:
+            logger.info("Sure bets did not improve since they were notified")
+            return
+        notify_keys = list(notify[MATCH_KEY_COLUMNS].itertuples(index=False, name=None))
+        reallocated = set(notify_keys)
+        bankroll = float(self._allocation.get("bankroll", self._config["max_bet"]))
+        balances = {
+            book: float(amount)
+            for book, amount in self._allocation.get("book_balances", {}).items()
+        }
+        for key, bet in open_bets.items():
+            if key in reallocated:
+                # its stakes are allocated again
+                continue
+            for book, value in zip(
+                [bet.get(column) for column in BOOK_COLUMNS], bet.get("invest_values") or []
+            ):
+                bankroll -= value
+                if book in balances:
+                    balances[book] -= value
+        with STAGE_SECONDS.time(stage="allocate", division=""):
+            funded = Analyzer.allocate_stakes(
+                notify,
+                bankroll=max(bankroll, 0.0),
+                min_bet=self._config["min_bet"],
+                max_bet=self._config["max_bet"],
+                book_balances={book: max(amount, 0.0) for book, amount in balances.items()},
+                book_caps=self._allocation.get("book_caps", {}),
+            )
+        unfunded = [
+            key
+            for key, is_funded in zip(notify_keys, notify.index.isin(funded.index))
+            if not is_funded
+        ]
+        # analyzed again in the next cycles, and notified once money is free for them
+        self.snapshots.forget(unfunded)
+        self.snapshots.discard(unfunded)
+        self.index.remove(BetType.SURE_BET, unfunded)
+        if funded.empty:
+            logger.info("No sure bet could be funded. Waiting for next iteration")
+            return
+        self.index.add(BetType.SURE_BET, funded, MATCH_KEY_COLUMNS)
+        with STAGE_SECONDS.time(stage="notify", division=""):
+            self.prepare_send_message(funded, BetType.SURE_BET)
+
+    def notify_sure_bets(self, df: pd.DataFrame, division: str = "") -> None:
+        """
+        Indexes the sure bets and notifies the ones that improved since their last notification
+        :param df: Dataframe containing the sure bets and their invest values
+        :param division: Sub division of the data, used for the metrics
+        :return: None
+        """
+        self.index.add(BetType.SURE_BET, df, MATCH_KEY_COLUMNS)
+        df = self.snapshots.filter_notifications(df)
+        if df.empty:
+            logger.info("Sure bets did not improve since they were notified")
+            return
+        with STAGE_SECONDS.time(stage="notify", division=division):
+            self.prepare_send_message(df, BetType.SURE_BET)
+
+    def check_positive_ev(
+        self, df: pd.DataFrame, grid: np.ndarray, books: List[str], excluded: List[str]
+    ) -> None:
+        """
+        Check if there are positive ev bets in the odds of all bookmakers
+        :param df: Dataframe containing scraped data of all subdivisions
+        :param grid: Odds of shape (matches, books, outcomes) of the match pages
+        :param books: Bookmakers of the grid
+        :param excluded: Bookmakers that can not be used
+        :return: None
+        """
+        ev_config = self._config["positive_ev"]
+        with STAGE_SECONDS.time(stage="analyze_ev", division=""):
+            ev = Analyzer.check_positive_ev(
+                df,
+                grid,
+                books,
+                min_edge=ev_config.get("min_edge", 0.03),
+                kelly_fraction=ev_config.get("kelly_fraction", 0.25),
+                bankroll=ev_config.get("bankroll", self._config["max_bet"]),
+                sharp_books=ev_config.get("sharp_books", []),
+                excluded_books=excluded,
+                min_books=ev_config.get("min_books", 3),
+            )
+        key_columns = MATCH_KEY_COLUMNS + ["outcome"]
+        found = set(ev[key_columns].itertuples(index=False, name=None))
+        outcomes = [col.replace("_odds", "") for col in ODDS_COLUMNS]
+        closed_keys = [
+            (*key, outcome)
+            for key in df[MATCH_KEY_COLUMNS].itertuples(index=False, name=None)
+            for outcome in outcomes
+            if (*key, outcome) not in found
+        ]
+        self.snapshots.forget(closed_keys)
+        self.index.remove(BetType.POSITIVE_EV_BET, closed_keys)
+        if ev.empty:
+            logger.info("No positive ev bet found. Waiting for next iteration")
+            return
+        ev = self.drop_stale(ev, BetType.POSITIVE_EV_BET)
+        self.index.add(BetType.POSITIVE_EV_BET, ev, key_columns)
+        ev = self.snapshots.filter_notifications(ev, key_columns, "edge")
+        self.prepare_send_message(ev, BetType.POSITIVE_EV_BET)
+
+    def drop_stale(self, df: pd.DataFrame, bet_type: BetType) -> pd.DataFrame:
+        """
+        Drops opportunities whose odds were scraped longer than the ttl ago.
+        Their subdivisions are analyzed again in the next cycle, so they
+        are notified once a fresh scrape verified them
+        :param df: Dataframe containing the opportunities
+        :param bet_type: Type of bet
+        :return: Dataframe with the fresh opportunities
+        """
+        if df.empty or "scraped_at" not in df:
+            return df
+        stale = (time.time() - df["scraped_at"] > self._ttl).to_numpy()
+        if not stale.any():
+            return df
+        STALE_OPPORTUNITIES.inc(int(stale.sum()), bet_type=str(bet_type))
+        divisions = df.loc[stale, ["sport", "sport_subdivision"]].drop_duplicates()
+        for sport, division in divisions.itertuples(index=False, name=None):
+            logger.warning(
+                f"Odds of {str(bet_type)} in {sport}: {division} are older than "
+                f"{self._ttl:.0f}s, verifying them in the next cycle"
+            )
+            self.snapshots.reset(sport, division)
+        return df[~stale]
 
     def prepare_send_message(self, df: pd.DataFrame, bet_type: BetType) -> None:
         """
@@ -89,17 +448,14 @@ class MyOddsBot:
         :param bet_type: Type of bet
         :return: None
         """
-        sure_bets = []
-        for index, row in df.iterrows():
-            sure_bets.append(row.to_dict())
-        for bet in sure_bets:
+        for bet in to_records(df):
             logger.info(f"Found {str(bet_type)}: {bet}")
             if self._config["telegram"]["enabled"]:
                 self.send_msg(bet, bet_type)
 
     def send_msg(self, bet: Dict[str, Any], bet_type: BetType) -> None:
         """
-        Sends message to telegram
+        Queues message to telegram, it is sent in the background
         :param bet: Bet as dictionary
         :param bet_type: Type of bet
         :return: None
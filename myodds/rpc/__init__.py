@@ -1 +1,7 @@
-from myodds.rpc.telegram import Telegram
+def __getattr__(name):
+    # python-telegram-bot is slow to import, load it only when telegram is enabled
+    if name == "Telegram":
+        from myodds.rpc.telegram import Telegram
+
+        return Telegram
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
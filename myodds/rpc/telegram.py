@@ -1,15 +1,62 @@
 import logging
-from typing import Any, Dict
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
 
 from telegram import ParseMode, Update
-from telegram.error import NetworkError, TelegramError
+from telegram.constants import MAX_MESSAGE_LENGTH
+from telegram.error import NetworkError, RetryAfter, TelegramError
 from telegram.ext import CallbackContext, CommandHandler, Updater
 
 from myodds.constants import BetType
+from myodds.metrics import ALERT_LATENCY_SECONDS, STAGE_SECONDS
 
 
 logger = logging.getLogger(__name__)
 
+Message = Tuple[str, str, List[float]]
+
+
+class TokenBucket:
+    """
+    Token bucket to throttle the messages sent to a chat
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        """
+        Initialization of class
+        :param rate: Tokens added per second
+        :param capacity: Maximum number of tokens (burst size)
+        :return: None
+        """
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def acquire(self) -> None:
+        """
+        Takes a token, sleeps until one is available if the bucket is empty
+        :return: None
+        """
+        self._refill()
+        if self._tokens < 1:
+            time.sleep((1 - self._tokens) / self._rate)
+            self._refill()
+        self._tokens -= 1
+
+    def _refill(self) -> None:
+        """
+        Adds the tokens of the time passed since the last refill
+        :return: None
+        """
+        now = time.monotonic()
+        self._tokens = min(
+            self._capacity, self._tokens + (now - self._updated) * self._rate
+        )
+        self._updated = now
+
 
 class Telegram:
     """
@@ -25,7 +72,20 @@ class Telegram:
         self._config = config
         self.token = self._config["telegram"]["token"]
         self.chat_id = self._config["telegram"]["chat_id"]
+        self._batch_window = float(self._config["telegram"].get("batch_window", 2))
+        self._max_retries = int(self._config["telegram"].get("max_retries", 5))
+        self._bucket = TokenBucket(
+            rate=float(self._config["telegram"].get("rate_limit", 1)),
+            capacity=float(self._config["telegram"].get("burst", 3)),
+        )
+        # outbound (message, parse mode, scrape times of its bets), None stops the worker
+        self._queue: "queue.Queue[Optional[Message]]" = queue.Queue()
+        self._worker = threading.Thread(
+            target=self._process_queue, name="telegram-sender", daemon=True
+        )
+        self._worker.start()
         self._updater = Updater(token=self.token, use_context=True)
+        self._handles: List[CommandHandler] = []
         self._init()
 
     def _init(self) -> None:
@@ -33,20 +93,26 @@ class Telegram:
         Define all commands the bot can use
         :return: None
         """
-        handles = [
+        self._handles = [
             CommandHandler("start", self._start),
             CommandHandler("help", self._help),
             CommandHandler("version", self._version),
         ]
 
-        for handle in handles:
+        for handle in self._handles:
             self._updater.dispatcher.add_handler(handle)
 
+    def start_polling(self) -> None:
+        """
+        Starts listening for the commands in the background. Not needed
+        for single runs, which only send messages
+        :return: None
+        """
         self._updater.start_polling()
 
         logger.info(
             "rpc.telegram is listening for following commands: %s",
-            [h.command for h in handles],
+            [h.command for h in self._handles],
         )
 
     def _start(self, update: Update, context: CallbackContext) -> None:
@@ -100,6 +166,7 @@ class Telegram:
             f"*Sub Division*: {bet['sport_subdivision']} \n"
             f"*{bet['team1']}* vs *{bet['team2']}* \n"
             f"*On*: {bet['date']} *at* {bet['play_time']}\n"
+            f"*Scraped*: {self._get_age(bet)} ago \n"
             f"*Expected Win*: {bet['expected_win']:.2%} \n"
             f"*Home* \n"
             f"{''.join(' ' for _ in range(4))}*Book*: {bet['home_book']} \n"
@@ -126,7 +193,37 @@ class Telegram:
         :param bet: Dictionary that contains all bet details
         :return: Message string
         """
-        pass
+        bet["emoji"] = self._get_emoji(bet)
+        bet["bet_type"] = str(bet["bet_type"]).replace("_", " ").title()
+
+        message = (
+            f"*{bet['bet_type']}* {bet['emoji']} \n"
+            f"*Sport*: {bet['sport']} \n"
+            f"*Sub Division*: {bet['sport_subdivision']} \n"
+            f"*{bet['team1']}* vs *{bet['team2']}* \n"
+            f"*On*: {bet['date']} *at* {bet['play_time']}\n"
+            f"*Scraped*: {self._get_age(bet)} ago \n"
+            f"*Edge*: {bet['edge']:.2%} \n"
+            f"*{bet['outcome'].title()}* \n"
+            f"{''.join(' ' for _ in range(4))}*Book*: {bet['book']} \n"
+            f"{''.join(' ' for _ in range(4))}*Odds*: `{bet['odds']}` \n"
+            f"{''.join(' ' for _ in range(4))}*Fair Odds*: `{bet['fair_odds']}` \n"
+            f"{''.join(' ' for _ in range(4))}*Kelly Stake*: `{bet['kelly_stake']}` \n"
+            f"*Data Source:* {bet['data_source']}"
+        )
+        return message
+
+    @staticmethod
+    def _get_age(bet: Dict[str, Any]) -> str:
+        """
+        Time since the odds of a bet were scraped
+        :param bet: Dictionary that contains all bet details
+        :return: Age as string (e.g. 42s), ? if the scrape time is unknown
+        """
+        scraped_at = bet.get("scraped_at")
+        if scraped_at is None or scraped_at != scraped_at:
+            return "?"
+        return f"{max(time.time() - scraped_at, 0):.0f}s"
 
     def _get_emoji(self, bet: Dict[str, Any]) -> str:
         """
@@ -156,31 +253,120 @@ class Telegram:
             msg = self.compose_positive_ev_bet(bet)
 
         self._send_message(
-            msg.replace("_", "")
+            msg.replace("_", ""), scraped_at=bet.get("scraped_at")
         )  # replace needed because can't parse underscore
 
-    def _send_message(self, message: str, parse_mode: str = ParseMode.MARKDOWN) -> None:
+    def stop(self) -> None:
         """
-        Send given message
+        Stops polling and sends the messages that are still queued
+        :return: None
+        """
+        self._updater.stop()
+        self._queue.put(None)
+        self._worker.join(timeout=30)
+
+    def _send_message(
+        self,
+        message: str,
+        parse_mode: str = ParseMode.MARKDOWN,
+        scraped_at: Optional[float] = None,
+    ) -> None:
+        """
+        Queues given message, it is sent in the background
         :param message: message
         :param parse_mode: telegram parse mode
+        :param scraped_at: Unix time the odds of the message were scraped
+        :return: None
+        """
+        scraped = [scraped_at] if scraped_at is not None and scraped_at == scraped_at else []
+        self._queue.put((message, parse_mode, scraped))
+
+    def _process_queue(self) -> None:
+        """
+        Worker which collects the queued messages of a short window
+        and sends them batched into as few messages as possible
         :return: None
         """
-        try:
+        running = True
+        while running:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self._batch_window
+            while True:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                batch.append(item)
+            for message, parse_mode, scraped in self._merge(batch):
+                with STAGE_SECONDS.time(stage="telegram"):
+                    delivered = self._deliver(message, parse_mode)
+                if delivered:
+                    now = time.time()
+                    for scraped_at in scraped:
+                        ALERT_LATENCY_SECONDS.observe(now - scraped_at)
+
+    @staticmethod
+    def _merge(batch: List[Message]) -> List[Message]:
+        """
+        Joins consecutive messages with the same parse mode as long
+        as they fit into one telegram message
+        :param batch: List of (message, parse mode, scrape times)
+        :return: List of merged (message, parse mode, scrape times)
+        """
+        merged: List[Message] = []
+        for message, parse_mode, scraped in batch:
+            if merged and merged[-1][1] == parse_mode:
+                joined = f"{merged[-1][0]}\n\n{message}"
+                if len(joined) <= MAX_MESSAGE_LENGTH:
+                    merged[-1] = (joined, parse_mode, merged[-1][2] + scraped)
+                    continue
+            merged.append((message, parse_mode, scraped))
+        return merged
+
+    def _deliver(self, message: str, parse_mode: str) -> bool:
+        """
+        Send given message respecting the rate limit of the chat,
+        retries with exponential backoff
+        :param message: message
+        :param parse_mode: telegram parse mode
+        :return: True if the message was sent
+        """
+        for attempt in range(self._max_retries + 1):
+            self._bucket.acquire()
             try:
                 self._updater.bot.send_message(
                     chat_id=self.chat_id, text=message, parse_mode=parse_mode
                 )
+                return True
+            except RetryAfter as retry_err:
+                # telegram tells us how long we are throttled
+                logger.warning(
+                    f"TelegramError: {retry_err.message}! Retrying in {retry_err.retry_after}s."
+                )
+                time.sleep(retry_err.retry_after)
             except NetworkError as network_err:
                 # Sometimes the telegram server resets the current connection,
                 # if this is the case we send the message again.
+                backoff = min(2**attempt, 60)
                 logger.warning(
-                    f"TelegramError: {network_err.message}! Trying one more time."
+                    f"TelegramError: {network_err.message}! Retrying in {backoff}s."
                 )
-                self._updater.bot.send_message(
-                    chat_id=self.chat_id, text=message, parse_mode=parse_mode
+                time.sleep(backoff)
+            except TelegramError as telegram_err:
+                logger.warning(
+                    f"TelegramError: {telegram_err.message}! Giving up on that message."
                 )
-        except TelegramError as telegram_err:
-            logger.warning(
-                f"TelegramError: {telegram_err.message}! Giving up on that message."
-            )
+                return False
+        logger.warning(
+            f"Could not send message after {self._max_retries} retries. Giving up on that message."
+        )
+        return False
@@ -0,0 +1,139 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from myodds.constants import REFRESH_TIME_SECONDS
+from myodds.metrics import CYCLE_SECONDS
+from myodds.utils import parse_kickoff
+
+
+logger = logging.getLogger(__name__)
+
+Division = Tuple[str, str, str]
+DivisionHandler = Callable[
+    [List[Division]], Awaitable[Dict[Tuple[str, str], pd.DataFrame]]
+]
+
+
+class Scheduler:
+    """
+    Event driven scheduler which sleeps until the next subdivision is due.
+    Every subdivision gets its own refresh interval, which tightens
+    when the next game of the subdivision is about to start
+    """
+
+    def __init__(self, config: Dict[str, Any], handler: DivisionHandler) -> None:
+        """
+        Initialization of class
+        :param config: Configuration dictionary
+        :param handler: Coroutine that scrapes and processes a list of due subdivisions
+        :return: None
+        """
+        refresh = config.get("refresh", {})
+        self._default_interval = float(
+            refresh.get("default_seconds", REFRESH_TIME_SECONDS)
+        )
+        self._division_intervals: Dict[str, float] = refresh.get("divisions", {})
+        # (minutes until kickoff, refresh seconds), checked from the closest kickoff
+        self._kickoff_tiers = sorted(
+            (float(minutes), float(seconds))
+            for minutes, seconds in refresh.get("kickoff_tiers", [[60, 60], [360, 150]])
+        )
+        self._heartbeat = float(refresh.get("heartbeat_seconds", 60))
+        self._handler = handler
+        self._heap: List[Tuple[float, int, Division]] = []
+        self._counter = itertools.count()
+
+    def add(self, division: Division, delay: float = 0) -> None:
+        """
+        Schedules a subdivision
+        :param division: (sport, subdivision, url) to scrape
+        :param delay: Seconds from now until it is due
+        :return: None
+        """
+        due = time.monotonic() + delay
+        heapq.heappush(self._heap, (due, next(self._counter), division))
+
+    async def run(self) -> None:
+        """
+        Runs the due subdivisions forever and sleeps in between
+        :return: None
+        """
+        heartbeat = asyncio.ensure_future(self._log_heartbeat())
+        try:
+            while self._heap:
+                delay = self._heap[0][0] - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                    continue
+                due = self._pop_due()
+                logger.info(f"Scraping now {[division for _, division, _ in due]}..")
+                try:
+                    with CYCLE_SECONDS.time():
+                        results = await self._handler(due)
+                except Exception:
+                    # the due subdivisions must stay scheduled, retried after their default interval
+                    logger.exception(
+                        f"Could not scrape {[division for _, division, _ in due]}. "
+                        f"Retrying them at their default interval.."
+                    )
+                    results = {}
+                for division in due:
+                    interval = self.get_interval(division, results.get(division[:2]))
+                    logger.debug(f"Next refresh of {division[1]} in {interval:.0f}s")
+                    self.add(division, interval)
+        finally:
+            heartbeat.cancel()
+
+    def _pop_due(self) -> List[Division]:
+        """
+        Removes all subdivisions that are due from the queue
+        :return: List of due subdivisions
+        """
+        now = time.monotonic()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due.append(heapq.heappop(self._heap)[2])
+        return due
+
+    def get_interval(self, division: Division, df: Optional[pd.DataFrame]) -> float:
+        """
+        Refresh interval of a subdivision based on its configured interval
+        and the closest upcoming kickoff in its last scraped data
+        :param division: (sport, subdivision, url)
+        :param df: Last scraped data of the subdivision, None if scraping failed
+        :return: Seconds until the subdivision should be scraped again
+        """
+        interval = float(
+            self._division_intervals.get(division[1], self._default_interval)
+        )
+        if df is None or df.empty:
+            return interval
+        now = datetime.now()
+        kickoffs = [
+            parse_kickoff(date, play_time, now)
+            for date, play_time in df[["date", "play_time"]].drop_duplicates().to_numpy()
+        ]
+        upcoming = [kickoff for kickoff in kickoffs if kickoff and kickoff >= now]
+        if not upcoming:
+            return interval
+        minutes = (min(upcoming) - now).total_seconds() / 60
+        for tier_minutes, tier_seconds in self._kickoff_tiers:
+            if minutes <= tier_minutes:
+                return min(interval, tier_seconds)
+        return interval
+
+    async def _log_heartbeat(self) -> None:
+        """
+        Logs that the bot is alive while it is waiting
+        :return: None
+        """
+        while True:
+            await asyncio.sleep(self._heartbeat)
+            logger.info("Bot is running")
@@ -1 +1,8 @@
-from myodds.scraper.scraper import Scraper
+def __getattr__(name):
+    # Scraper needs playwright, load it only when used so the
+    # extractors can run on saved html without a browser
+    if name == "Scraper":
+        from myodds.scraper.scraper import Scraper
+
+        return Scraper
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,168 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+from playwright.async_api import Page, async_playwright
+
+from myodds.scraper.resource_filter import ResourceFilter
+from myodds.utils import get_process_tree_rss
+
+
+logger = logging.getLogger(__name__)
+
+
+class BrowserPool:
+    """
+    Long lived browser which keeps warmed up pages (location pop-up already
+    dismissed) across cycles. A page is recycled when it is unhealthy or
+    after a number of navigations and the whole browser is relaunched
+    when the memory of the process tree passes a threshold
+    """
+
+    def __init__(self, config: Dict[str, Any]) -> None:
+        """
+        Initialization of class
+        :param config: Configuration dictionary
+        :return: None
+        """
+        self._config = config
+        pool_config = self._config.get("browser_pool", {})
+        self._size = max(1, int(self._config.get("concurrency", 1)))
+        self._max_navigations = int(pool_config.get("max_navigations", 50))
+        self._max_rss_mb = float(pool_config.get("max_rss_mb", 1500))
+        self._health_timeout = float(pool_config.get("health_check_timeout", 5))
+        resilience = self._config.get("resilience", {})
+        self._navigation_timeout = float(resilience.get("navigation_timeout_ms", 30000))
+        self._p: Any = None
+        self._browser: Any = None
+        # a None entry is a slot whose page still has to be created
+        self._pages: "asyncio.Queue[Optional[Page]]"
+        self._navigations: Dict[Page, int] = {}
+        self._resource_filter = ResourceFilter(self._config)
+
+    @property
+    def started(self) -> bool:
+        """
+        Whether the browser is launched and still connected
+        :return: True if the pool can hand out pages
+        """
+        return self._browser is not None and self._browser.is_connected()
+
+    async def start(self) -> None:
+        """
+        Launches the browser if it is not running yet and relaunches it
+        if it crashed or uses more memory than allowed.
+        Must only be called while no page is in use
+        :return: None
+        """
+        if self.started:
+            rss = get_process_tree_rss()
+            if rss is None or rss < self._max_rss_mb:
+                return
+            logger.info(
+                f"Browser uses {rss:.0f}MB (limit {self._max_rss_mb:.0f}MB). Relaunching it.."
+            )
+        await self.stop()
+        self._p = await async_playwright().start()
+        if self._config["proxy"]["enabled"]:
+            self._browser = await self._p.firefox.launch(
+                headless=self._config["headless"],
+                proxy={"server": self._config["proxy"]["server"]},
+            )
+        else:
+            self._browser = await self._p.firefox.launch(
+                headless=self._config["headless"]
+            )
+        self._pages = asyncio.Queue()
+        for _ in range(self._size):
+            self._pages.put_nowait(await self._new_page())
+
+    async def stop(self) -> None:
+        """
+        Closes the browser and all of its pages
+        :return: None
+        """
+        self._navigations = {}
+        if self._p is not None:
+            await self._p.stop()
+        self._p = None
+        self._browser = None
+
+    @asynccontextmanager
+    async def page(self) -> AsyncIterator[Page]:
+        """
+        Waits for a free healthy page and gives it back to the pool afterwards.
+        Every usage counts as one navigation of the page
+        :return: Iterator yielding the page
+        """
+        page = await self._pages.get()
+        try:
+            if page is None or not await self._is_healthy(page):
+                await self._close_page(page)
+                page = None
+                page = await self._new_page()
+            yield page
+        except (Exception, asyncio.CancelledError):
+            # the page may be stuck in a failed or cancelled navigation
+            await self._close_page(page)
+            page = None
+            raise
+        finally:
+            if page is not None:
+                self._navigations[page] = self._navigations.get(page, 0) + 1
+                if self._navigations[page] >= self._max_navigations:
+                    await self._close_page(page)
+                    page = None
+            self._pages.put_nowait(page)
+
+    async def _new_page(self) -> Page:
+        """
+        Creates a page in a fresh filtered context and dismisses the location pop-up
+        :return: Warmed up page
+        """
+        context = await self._browser.new_context()
+        # goto, wait_for_load_state and clicks fail after the navigation timeout
+        context.set_default_navigation_timeout(self._navigation_timeout)
+        context.set_default_timeout(self._navigation_timeout)
+        await self._resource_filter.install(context)
+        page = await context.new_page()
+        await page.goto(self._config["base_url"])
+        await page.wait_for_load_state("networkidle")
+        try:
+            await page.locator("#om-bzoadzmqncddgwp3ksmq").click(timeout=5000)
+            await page.wait_for_load_state("networkidle")
+        except Exception:
+            # the pop-up is not shown, e.g. because its script was filtered
+            logger.debug("Location pop-up not found")
+        self._navigations[page] = 0
+        return page
+
+    async def _is_healthy(self, page: Page) -> bool:
+        """
+        Checks that the page is open and still responds
+        :param page: Page to check
+        :return: True if the page can be used
+        """
+        if page.is_closed():
+            return False
+        try:
+            await asyncio.wait_for(page.evaluate("1"), self._health_timeout)
+        except Exception as e:
+            logger.warning(f"Browser page is not responding. Exception {e}, recycling it")
+            return False
+        return True
+
+    async def _close_page(self, page: Optional[Page]) -> None:
+        """
+        Closes the context of a page, ignoring errors of broken pages
+        :param page: Page to close
+        :return: None
+        """
+        if page is None:
+            return
+        self._navigations.pop(page, None)
+        try:
+            await page.context.close()
+        except Exception:
+            logger.debug("Could not close browser context, it is already gone")
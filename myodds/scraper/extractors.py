@@ -0,0 +1,298 @@
+"""
+Backends to extract the games from a scraped oddschecker page.
+Every backend returns the same raw games, which are turned into
+records by get_3_way_data and collected in a MatchTable, which
+build_matches turns into the dataframe of the division
+"""
+
+import abc
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urljoin
+
+import pandas as pd
+from bs4 import BeautifulSoup
+
+from myodds.constants import DAY, DAYDATE, ODDS, PLAY_TIME, SPORT_INFO, TEAMS
+from myodds.metrics import SKIPPED_ENTRIES
+from myodds.model import MatchTable
+from myodds.utils import get_3_way_data, normalize_date
+
+
+logger = logging.getLogger(__name__)
+
+# Collects the games of a page inside the browser, mirrors Bs4Extractor
+EXTRACT_GAMES_SCRIPT = """
+([day, dayDate, sportInfo, playTime, teams, odds]) => {
+    const select = (root, tag, cls) =>
+        Array.from(root.querySelectorAll(tag + "." + cls.split(" ").join(".")));
+    return select(document, "ul", day).flatMap((dayElement) => {
+        const date = select(dayElement, "div", dayDate)[0];
+        const playTimes = select(dayElement, "div", playTime);
+        return select(dayElement, "div", sportInfo).map((game, i) => ({
+            date: date ? date.textContent : null,
+            play_time: playTimes[i] ? playTimes[i].textContent : null,
+            teams: select(game, "div", teams).map((team) => team.textContent),
+            odds: select(game, "div", odds).map((odd) => odd.textContent),
+            books: select(game, "div", odds).map((odd) => {
+                const image = odd.querySelector("img");
+                return image ? image.getAttribute("alt") : null;
+            }),
+            link: game.querySelector("a[href]")
+                ? game.querySelector("a[href]").getAttribute("href")
+                : null,
+        }));
+    });
+}
+"""
+
+# Texts of the dates, times, teams, odds with their bookmaker and the match links,
+# they change whenever the games of the page change
+FINGERPRINT_SCRIPT = """
+([dayDate, playTime, teams, odds, sportInfo]) => {
+    const select = (cls) =>
+        Array.from(document.querySelectorAll("div." + cls.split(" ").join(".")));
+    return [
+        select(dayDate).map((date) => date.textContent),
+        select(playTime).map((time) => time.textContent),
+        select(teams).map((team) => team.textContent),
+        select(odds).map((odd) => {
+            const image = odd.querySelector("img");
+            return odd.textContent + "@" + (image ? image.getAttribute("alt") : "");
+        }),
+        select(sportInfo).map((game) => {
+            const link = game.querySelector("a[href]");
+            return link ? link.getAttribute("href") : "";
+        }),
+    ].map((texts) => texts.join("\\u0001")).join("\\u0002");
+}
+"""
+
+# Collects the odds table of a match page as {book: [odds of every outcome]}
+EXTRACT_GRID_SCRIPT = """
+([row, cell, header, bookAttribute, oddsAttribute]) => {
+    // columns are keyed by bookmaker codes, the listing uses the names of the logos
+    const names = {};
+    document.querySelectorAll(header).forEach((column) => {
+        const logo = column.querySelector("[title], img[alt]");
+        const name = logo && (logo.getAttribute("title") || logo.getAttribute("alt"));
+        if (name) names[column.getAttribute(bookAttribute)] = name.trim();
+    });
+    const grid = {};
+    const rows = Array.from(document.querySelectorAll(row));
+    rows.forEach((outcome, i) => {
+        outcome.querySelectorAll(cell).forEach((odd) => {
+            const code = odd.getAttribute(bookAttribute);
+            const value = parseFloat(odd.getAttribute(oddsAttribute));
+            if (!code) return;
+            const book = names[code] || code;
+            grid[book] = grid[book] || new Array(rows.length).fill(null);
+            grid[book][i] = Number.isFinite(value) ? value : null;
+        });
+    });
+    return grid;
+}
+"""
+
+
+class Extractor(abc.ABC):
+    """
+    Base class of the extraction backends. A game is a dictionary with
+    date, play_time, teams, odds, books and the link to the match page
+    """
+
+    name = ""
+    # in page backends run a script in the browser instead of parsing the html
+    in_page = False
+    script = ""
+    selectors = [DAY, DAYDATE, SPORT_INFO, PLAY_TIME, TEAMS, ODDS]
+
+    @abc.abstractmethod
+    def parse(self, content: str) -> List[Dict[str, Any]]:
+        """
+        Extracts all games from the html of a page
+        :param content: Html of the page
+        :return: List of games
+        """
+
+
+class Bs4Extractor(Extractor):
+    """
+    Extracts the games with BeautifulSoup and the pure python html.parser
+    """
+
+    name = "bs4"
+
+    def parse(self, content: str) -> List[Dict[str, Any]]:
+        """
+        Extracts all games from the html of a page
+        :param content: Html of the page
+        :return: List of games
+        """
+        soup = BeautifulSoup(content, "html.parser")
+        games = []
+        for day in soup.find_all("ul", class_=DAY):
+            date = day.find("div", class_=DAYDATE).text
+            play_time = day.find_all("div", class_=PLAY_TIME)
+            for i, game in enumerate(day.find_all("div", class_=SPORT_INFO)):
+                odds = game.find_all("div", class_=ODDS)
+                images = [odd.find("img") for odd in odds]
+                link = game.find("a", href=True)
+                games.append(
+                    {
+                        "date": date,
+                        "play_time": play_time[i].text,
+                        "teams": [team.text for team in game.find_all("div", class_=TEAMS)],
+                        "odds": [odd.text for odd in odds],
+                        "books": [image.get("alt") if image else None for image in images],
+                        "link": link.get("href") if link else None,
+                    }
+                )
+        return games
+
+
+class LxmlExtractor(Extractor):
+    """
+    Extracts the games with the C backed lxml parser
+    """
+
+    name = "lxml"
+
+    def __init__(self) -> None:
+        """
+        Initialization of class, fails if lxml is not installed
+        :return: None
+        """
+        from lxml import html
+
+        self._html = html
+
+    @staticmethod
+    def _xpath(tag: str, cls: str) -> str:
+        """
+        Relative xpath of all descendants with a tag that have all given classes
+        :param tag: Html tag
+        :param cls: Space separated classes
+        :return: Xpath expression
+        """
+        checks = " and ".join(
+            f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+            for name in cls.split()
+        )
+        return f".//{tag}[{checks}]"
+
+    def parse(self, content: str) -> List[Dict[str, Any]]:
+        """
+        Extracts all games from the html of a page
+        :param content: Html of the page
+        :return: List of games
+        """
+        tree = self._html.fromstring(content)
+        games = []
+        for day in tree.xpath(self._xpath("ul", DAY)):
+            date = day.xpath(self._xpath("div", DAYDATE))[0].text_content()
+            play_time = day.xpath(self._xpath("div", PLAY_TIME))
+            for i, game in enumerate(day.xpath(self._xpath("div", SPORT_INFO))):
+                odds = game.xpath(self._xpath("div", ODDS))
+                images = [odd.xpath(".//img") for odd in odds]
+                links = game.xpath(".//a/@href")
+                games.append(
+                    {
+                        "date": date,
+                        "play_time": play_time[i].text_content(),
+                        "teams": [
+                            team.text_content()
+                            for team in game.xpath(self._xpath("div", TEAMS))
+                        ],
+                        "odds": [odd.text_content() for odd in odds],
+                        "books": [image[0].get("alt") if image else None for image in images],
+                        "link": links[0] if links else None,
+                    }
+                )
+        return games
+
+
+class EvaluateExtractor(Bs4Extractor):
+    """
+    Extracts the games inside the browser and only transfers compact rows.
+    Html that was already grabbed is parsed like Bs4Extractor, which the script mirrors
+    """
+
+    name = "evaluate"
+    in_page = True
+    script = EXTRACT_GAMES_SCRIPT
+
+
+EXTRACTORS = {
+    extractor.name: extractor
+    for extractor in (Bs4Extractor, LxmlExtractor, EvaluateExtractor)
+}
+
+
+def get_extractor(name: Optional[str]) -> Extractor:
+    """
+    Creates the configured extraction backend, falls back
+    to bs4 if the backend is not available
+    :param name: Name of the backend (bs4, lxml or evaluate)
+    :return: Extractor
+    """
+    name = name or Bs4Extractor.name
+    if name not in EXTRACTORS:
+        logger.warning(f"Unknown extractor {name}. Using {Bs4Extractor.name}")
+        return Bs4Extractor()
+    try:
+        return EXTRACTORS[name]()
+    except ImportError as e:
+        logger.warning(f"Extractor {name} is not available ({e}). Using {Bs4Extractor.name}")
+        return Bs4Extractor()
+
+
+def build_matches(
+    games: List[Dict[str, Any]],
+    sport: str,
+    division: str,
+    url: str,
+    scraped_at: Optional[float] = None,
+) -> pd.DataFrame:
+    """
+    Turns the extracted games of a page into a dataframe. Dates are
+    normalized, so they are equal for every extractor and the odds api
+    :param games: Games returned by an extractor
+    :param sport: Sport that was scraped
+    :param division: Sub division of the sport
+    :param url: Url the games were scraped from
+    :param scraped_at: Unix time the games were scraped, defaults to now
+    :return: Dataframe with scraped data
+    """
+    table = MatchTable()
+    now = datetime.now()
+    # the games of a page share a few dates and times
+    dates: Dict[Tuple[Any, Any], Any] = {}
+    for game in games:
+        teams = game["teams"]
+        try:
+            day = (game["date"], game["play_time"])
+            if day not in dates:
+                dates[day] = normalize_date(*day, now)
+            info = get_3_way_data(
+                dates[day],
+                sport,
+                division,
+                game["play_time"],
+                teams,
+                game["odds"],
+                game["books"],
+                url,
+            )
+            # still need to distinguish between 2 or 3 way and get game and subdivision beforehand
+            info["match_url"] = urljoin(url, game["link"]) if game.get("link") else None
+            table.append(info)
+        except Exception as e:
+            SKIPPED_ENTRIES.inc(division=division)
+            logger.warning(
+                f"Could not retrive data for {sport}: {division} on {game['date']} "
+                f"for {teams[0]} vs. {teams[1]}. Exception {e}, skipping entry."
+            )
+    return table.to_frame(scraped_at if scraped_at is not None else time.time())
@@ -0,0 +1,93 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class CircuitBreaker:
+    """
+    Keeps track of the failures of every url. After failure_threshold
+    failures in a row the circuit opens and the url is skipped for a
+    cooldown, which doubles every time the url fails again right after it
+    """
+
+    def __init__(self, config: Dict[str, Any]) -> None:
+        """
+        Initialization of class
+        :param config: Configuration dictionary
+        :return: None
+        """
+        resilience = config.get("resilience", {})
+        self._threshold = max(1, int(resilience.get("failure_threshold", 3)))
+        self._cooldown = float(resilience.get("cooldown_seconds", 300))
+        self._max_cooldown = float(resilience.get("max_cooldown_seconds", 3600))
+        # url -> (failures in a row, monotonic time until the circuit is open)
+        self._state: Dict[str, Tuple[int, float]] = {}
+
+    def allow(self, url: str) -> bool:
+        """
+        Checks if a url can be scraped. Once the cooldown passed one
+        more try is allowed
+        :param url: Url to scrape
+        :return: False while the circuit of the url is open
+        """
+        _, open_until = self._state.get(url, (0, 0.0))
+        return time.monotonic() >= open_until
+
+    def record_success(self, url: str) -> None:
+        """
+        Closes the circuit of a url
+        :param url: Url that was scraped
+        :return: None
+        """
+        self._state.pop(url, None)
+
+    def record_failure(self, url: str) -> Optional[float]:
+        """
+        Counts a failure of a url and opens its circuit if there were too many
+        :param url: Url that failed
+        :return: Cooldown in seconds if the circuit opened, otherwise None
+        """
+        failures = self._state.get(url, (0, 0.0))[0] + 1
+        if failures < self._threshold:
+            self._state[url] = (failures, 0.0)
+            return None
+        cooldown = min(self._cooldown * 2 ** (failures - self._threshold), self._max_cooldown)
+        self._state[url] = (failures, time.monotonic() + cooldown)
+        return cooldown
+
+
+async def retry(
+    func: Callable[[], Awaitable[T]],
+    attempts: int,
+    timeout: Optional[float],
+    backoff: float,
+    max_backoff: float,
+    on_retry: Optional[Callable[[int, Exception], None]] = None,
+) -> T:
+    """
+    Awaits a coroutine function with a timeout and retries it with capped
+    exponential backoff (with jitter) when it fails
+    :param func: Function creating the coroutine, called once per attempt
+    :param attempts: Maximum number of attempts
+    :param timeout: Seconds an attempt may take, None if func enforces its own timeout
+    :param backoff: Seconds to wait after the first failure, doubled after every failure
+    :param max_backoff: Maximum seconds to wait between attempts
+    :param on_retry: Called with the attempt number and the exception before retrying
+    :return: Result of the first successful attempt
+    """
+    for attempt in range(max(1, attempts) - 1):
+        try:
+            return await asyncio.wait_for(func(), timeout)
+        except Exception as e:
+            if on_retry is not None:
+                on_retry(attempt + 1, e)
+            delay = min(backoff * 2**attempt, max_backoff)
+            await asyncio.sleep(delay * random.uniform(0.5, 1))
+    return await asyncio.wait_for(func(), timeout)
@@ -0,0 +1,88 @@
+import logging
+from typing import Any, Dict, Iterable, Tuple
+from urllib.parse import urlsplit
+
+from playwright.async_api import BrowserContext, Route
+
+
+logger = logging.getLogger(__name__)
+
+
+class ResourceFilter:
+    """
+    Aborts requests the scraper does not need (images, fonts, trackers, ads..)
+    Block lists are checked first, afterwards a non empty allow list
+    only lets the listed resource types and domains through
+    """
+
+    def __init__(self, config: Dict[str, Any]) -> None:
+        """
+        Initialization of class
+        :param config: Configuration dictionary
+        :return: None
+        """
+        filter_config = config.get("resource_filter", {})
+        self.enabled = bool(filter_config.get("enabled", False))
+        self._block_types = set(filter_config.get("block_resource_types", []))
+        self._block_domains = self._normalize(filter_config.get("block_domains", []))
+        self._allow_types = set(filter_config.get("allow_resource_types", []))
+        self._allow_domains = self._normalize(filter_config.get("allow_domains", []))
+        self.blocked = 0
+
+    @staticmethod
+    def _normalize(domains: Iterable[str]) -> Tuple[str, ...]:
+        """
+        Lower cases the domains and strips leading dots
+        :param domains: Configured domains
+        :return: Tuple of domains
+        """
+        return tuple(domain.lower().lstrip(".") for domain in domains)
+
+    @staticmethod
+    def _matches(host: str, domains: Tuple[str, ...]) -> bool:
+        """
+        Checks if the host is one of the domains or a subdomain of them
+        :param host: Host name of the request
+        :param domains: Domains to check against
+        :return: True if the host matches
+        """
+        return any(host == domain or host.endswith("." + domain) for domain in domains)
+
+    def is_allowed(self, url: str, resource_type: str) -> bool:
+        """
+        Checks if a request should be loaded
+        :param url: Url of the request
+        :param resource_type: Playwright resource type (document, script, image..)
+        :return: True if the request can continue
+        """
+        host = (urlsplit(url).hostname or "").lower()
+        if resource_type in self._block_types or self._matches(host, self._block_domains):
+            return False
+        if self._allow_types and resource_type not in self._allow_types:
+            return False
+        if self._allow_domains and not self._matches(host, self._allow_domains):
+            return False
+        return True
+
+    async def install(self, context: BrowserContext) -> None:
+        """
+        Routes all requests of a browser context through the filter
+        :param context: Browser context
+        :return: None
+        """
+        if self.enabled:
+            await context.route("**/*", self._handle)
+
+    async def _handle(self, route: Route) -> None:
+        """
+        Continues or aborts an intercepted request
+        :param route: Intercepted route
+        :return: None
+        """
+        request = route.request
+        if self.is_allowed(request.url, request.resource_type):
+            await route.continue_()
+        else:
+            self.blocked += 1
+            logger.debug(f"Blocked {request.resource_type}: {request.url}")
+            await route.abort()
@@ -0,0 +1,172 @@
+import asyncio
+import importlib
+import logging
+import re
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from playwright.async_api import Page, Response
+
+
+logger = logging.getLogger(__name__)
+
+Decoder = Callable[[Any], List[Dict[str, Any]]]
+
+
+def get_path(data: Any, path: Optional[str]) -> Any:
+    """
+    Looks up a dotted path (e.g. "event.teams.0.name") in a json payload
+    :param data: Decoded json
+    :param path: Dotted path, numbers index lists
+    :return: Value or None if the path does not exist
+    """
+    if not path:
+        return data
+    for key in path.split("."):
+        if isinstance(data, list) and key.lstrip("-").isdigit():
+            index = int(key)
+            data = data[index] if -len(data) <= index < len(data) else None
+        elif isinstance(data, dict):
+            data = data.get(key)
+        else:
+            return None
+        if data is None:
+            return None
+    return data
+
+
+class FieldDecoder:
+    """
+    Decodes odds payloads into the games of the extractors with the
+    dotted paths of the configuration. The list of games is found at
+    "games", the other paths are relative to a game
+    """
+
+    def __init__(self, fields: Dict[str, Any]) -> None:
+        """
+        Initialization of class
+        :param fields: Paths of games, date, play_time or kickoff, teams, odds, books and link
+        :return: None
+        """
+        self._fields = fields
+
+    def __call__(self, payload: Any) -> List[Dict[str, Any]]:
+        """
+        Decodes a payload
+        :param payload: Decoded json of a response
+        :return: List of games
+        """
+        events = get_path(payload, self._fields.get("games"))
+        if not isinstance(events, list):
+            return []
+        games = []
+        for event in events:
+            date = self._get(event, "date")
+            play_time = self._get(event, "play_time")
+            kickoff = self._get(event, "kickoff")
+            if kickoff is not None:
+                # iso timestamp, formatted like the dates parse_kickoff understands
+                kickoff = datetime.fromisoformat(str(kickoff).replace("Z", "+00:00"))
+                if kickoff.tzinfo is not None:
+                    kickoff = kickoff.astimezone()
+                date, play_time = kickoff.strftime("%d/%m"), kickoff.strftime("%H:%M")
+            games.append(
+                {
+                    "date": date,
+                    "play_time": play_time,
+                    "teams": [get_path(event, path) for path in self._fields.get("teams", [])],
+                    "odds": [get_path(event, path) for path in self._fields.get("odds", [])],
+                    "books": [get_path(event, path) for path in self._fields.get("books", [])],
+                    "link": self._get(event, "link"),
+                }
+            )
+        return games
+
+    def _get(self, event: Any, field: str) -> Any:
+        """
+        Looks up a single field of a game
+        :param event: Decoded json of a game
+        :param field: Name of the field in the configuration
+        :return: Value or None if the field has no path or the path does not exist
+        """
+        path = self._fields.get(field)
+        return get_path(event, path) if path else None
+
+
+def load_decoder(spec: Union[str, Dict[str, Any]]) -> Decoder:
+    """
+    Creates the configured decoder
+    :param spec: Paths for a FieldDecoder or "module:function" of a custom decoder
+    :return: Decoder
+    """
+    if isinstance(spec, dict):
+        return FieldDecoder(spec)
+    module, _, function = spec.partition(":")
+    return getattr(importlib.import_module(module), function)
+
+
+class ResponseCapture:
+    """
+    Listens to the responses of a page for the payloads of the odds api
+    and decodes them into games, so the page does not need to be rendered
+    and scrolled
+    """
+
+    def __init__(self, config: Dict[str, Any]) -> None:
+        """
+        Initialization of class
+        :param config: Configuration dictionary
+        :return: None
+        """
+        capture_config = config.get("api_capture", {})
+        self.enabled = bool(capture_config.get("enabled", False))
+        pattern = capture_config.get("url_pattern", r"$^")
+        if self.enabled and not pattern:
+            # an empty pattern matches every response of the page, images and scripts included
+            logger.warning("api_capture.url_pattern is empty. Disabling the odds api capture")
+            self.enabled = False
+        self._pattern = re.compile(pattern or r"$^")
+        self._wait = float(capture_config.get("wait_seconds", 5))
+        self._settle = float(capture_config.get("settle_ms", 500)) / 1000
+        self._decoder: Optional[Decoder] = None
+        if self.enabled:
+            self._decoder = load_decoder(capture_config.get("decoder", {}))
+
+    async def capture(self, page: Page, url: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Opens the page and decodes the odds payloads it receives. Waits up to
+        wait_seconds for the first payload and until no new payload came for settle_ms
+        :param page: Browser page used for scraping
+        :param url: Url of the page
+        :return: List of games or None if no payload could be decoded
+        """
+        payloads: List["asyncio.Future[Any]"] = []
+
+        def on_response(response: Response) -> None:
+            if self._pattern.search(response.url):
+                payloads.append(asyncio.ensure_future(response.json()))
+
+        loop = asyncio.get_running_loop()
+        page.on("response", on_response)
+        try:
+            await page.goto(url)
+            deadline = loop.time() + self._wait
+            while not payloads and loop.time() < deadline:
+                await asyncio.sleep(0.05)
+            seen = -1
+            while payloads and len(payloads) != seen:
+                seen = len(payloads)
+                await asyncio.sleep(self._settle)
+            results = await asyncio.gather(*payloads, return_exceptions=True)
+        finally:
+            page.remove_listener("response", on_response)
+        games = []
+        for payload in results:
+            if isinstance(payload, Exception):
+                logger.debug(f"Could not read an odds payload of {url}. Exception {payload}")
+                continue
+            try:
+                games.extend(self._decoder(payload))
+            except Exception as e:
+                logger.warning(f"Could not decode an odds payload of {url}. Exception {e}")
+        return games or None
@@ -1,22 +1,62 @@
+import asyncio
+import hashlib
+import json
 import logging
 import time
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional, Tuple
 
 import pandas as pd
-from bs4 import BeautifulSoup
-from playwright.sync_api import sync_playwright, Playwright
+from playwright.async_api import Page
 
-from myodds.constants import COLUMNS, DAY, DAYDATE, ODDS, PLAY_TIME, SPORT_INFO, TEAMS
-from myodds.utils import get_2_way_data, get_3_way_data
+from myodds.constants import (
+    GRID_BOOK_ATTRIBUTE,
+    GRID_CELL,
+    GRID_HEADER,
+    GRID_ODDS_ATTRIBUTE,
+    DAYDATE,
+    GRID_ROW,
+    ODDS,
+    PLAY_TIME,
+    SPORT_INFO,
+    TEAMS,
+)
+from myodds.metrics import (
+    API_CAPTURES,
+    CIRCUIT_OPEN,
+    PAGES,
+    SCRAPE_FAILURES,
+    SCRAPE_RETRIES,
+    SCRAPED_MATCHES,
+    SCROLLS,
+    STAGE_SECONDS,
+)
+from myodds.scraper.browser_pool import BrowserPool
+from myodds.scraper.resilience import CircuitBreaker, retry
+from myodds.scraper.responses import ResponseCapture
+from myodds.scraper.sources import Source, load_sources, merge_sources
+from myodds.scraper.extractors import (
+    EXTRACT_GRID_SCRIPT,
+    FINGERPRINT_SCRIPT,
+    build_matches,
+    get_extractor,
+)
 
 
 logger = logging.getLogger(__name__)
 
+# number of loaded matches and whether the page is scrolled to the bottom
+COUNT_ROWS_SCRIPT = """
+(className) => [
+    document.getElementsByClassName(className).length,
+    window.scrollY + window.innerHeight >= document.body.scrollHeight - 1,
+]
+"""
+
 
 class Scraper:
     """
-    Class for scraping the data from https://www.oddschecker.com/it
-    for a specific sport
+    Class for scraping the data of a specific sport from the configured
+    sources, https://www.oddschecker.com/it by default
     """
 
     def __init__(self, config: Dict[str, Any]) -> None:
@@ -26,93 +66,362 @@ class Scraper:
         :return: None
         """
         self._config = config
-        self._p: Any = None
-        self._page: Any
+        self.pool = BrowserPool(self._config)
+        self._extractor = get_extractor(self._config.get("extractor"))
+        self._capture = ResponseCapture(self._config)
+        self.sources = load_sources(self._config)
+        self._team_aliases = self._config.get("team_aliases", {})
+        resilience = self._config.get("resilience", {})
+        self._attempts = int(resilience.get("attempts", 3))
+        self._page_timeout = float(resilience.get("page_timeout_seconds", 90))
+        self._backoff = float(resilience.get("backoff_seconds", 2))
+        self._max_backoff = float(resilience.get("max_backoff_seconds", 30))
+        self._breaker = CircuitBreaker(self._config)
+        self._skip_unchanged = self._config.get("skip_unchanged_pages", True)
+        # fingerprint of the odds of every page and the matches parsed from it
+        self._pages: Dict[str, Tuple[str, pd.DataFrame]] = {}
+        scroll = self._config.get("scroll", {})
+        self._scroll_step = int(scroll.get("step", 1000))
+        self._scroll_settle = float(scroll.get("settle_ms", 250)) / 1000
+        self._scroll_stable_rounds = int(scroll.get("stable_rounds", 2))
+        self._scroll_max_scrolls = int(scroll.get("max_scrolls", 30))
+        self._scroll_max_seconds = float(scroll.get("max_seconds", 10))
 
-    def _get_browser_page(self) -> None:
+    async def _get_browser_page(self) -> None:
         """
-        Open a browser which stays open until closed
-        and sets a page that is used for scrolling
-        It click on the page such that the location does not appear again
-        and the matches can be scraped without problems
+        Makes sure the browser with its warmed up pages is running.
+        The browser stays open across cycles until it is stopped
         :return: None
         """
-        self._p = sync_playwright().start()
-        if self._config["proxy"]["enabled"]:
-            browser = self._p.firefox.launch(
-                headless=self._config["headless"],
-                proxy={"server": self._config["proxy"]["server"]},
-            )
-        else:
-            browser = self._p.firefox.launch(headless=self._config["headless"])
-        self._page = browser.new_page()
-        self._page.goto(self._config["base_url"])
-        self._page.wait_for_load_state("networkidle")
-        self._page.locator("#om-bzoadzmqncddgwp3ksmq").click()
-        self._page.wait_for_load_state("networkidle")
+        await self.pool.start()
 
-    def _stop_browser(self) -> None:
+    async def _stop_browser(self) -> None:
         """
         Closes the open browser which stayed open
         :return: None
         """
-        if self._p is not None:
-            self._p.stop()
+        await self.pool.stop()
+
+    async def _load_page(
+        self, page: Page, url: str, division: str = "", navigate: bool = True
+    ) -> None:
+        """
+        Opens the requested page and scrolls until all matches are loaded
+        :param page: Browser page used for scraping
+        :param url: Url that needs to bet scraped
+        :param division: Sub division of the page, used for the metrics
+        :param navigate: False if the page already shows the url and only needs scrolling
+        :return: None
+        """
+        if navigate:
+            with STAGE_SECONDS.time(stage="goto", division=division):
+                await page.goto(url)
+        with STAGE_SECONDS.time(stage="scroll", division=division):
+            scrolls = await self._scroll_until_loaded(page, url)
+        SCROLLS.observe(scrolls, division=division)
 
-    def _get_html(self, url: str) -> Any:
+    async def _scroll_until_loaded(self, page: Page, url: str) -> int:
+        """
+        Scrolls down until the page is at the bottom and the number of
+        matches did not change for stable_rounds scrolls, or the scroll
+        budget is used up
+        :param page: Browser page used for scraping
+        :param url: Url of the page, used for logging
+        :return: Number of scrolls needed
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self._scroll_max_seconds
+        rows, _ = await page.evaluate(COUNT_ROWS_SCRIPT, SPORT_INFO)
+        stable = 0
+        scrolls = 0
+        while scrolls < self._scroll_max_scrolls and loop.time() < deadline:
+            await page.mouse.wheel(0, self._scroll_step)
+            scrolls += 1
+            await asyncio.sleep(self._scroll_settle)
+            count, at_bottom = await page.evaluate(COUNT_ROWS_SCRIPT, SPORT_INFO)
+            stable = stable + 1 if count == rows else 0
+            rows = count
+            if at_bottom and stable >= self._scroll_stable_rounds:
+                logger.debug(f"Loaded {rows} matches of {url} after {scrolls} scrolls")
+                return scrolls
+        logger.warning(f"Scroll budget used up for {url} with {rows} matches loaded")
+        return scrolls
+
+    async def _get_html(self, page: Page, url: str, division: str = "") -> Any:
         """
         Grabs html from requested page
+        :param page: Browser page used for scraping
+        :param url: Url that needs to bet scraped
+        :param division: Sub division of the page, used for the metrics
+        :return: Html of the page
+        """
+        await self._load_page(page, url, division)
+        return await self._get_content(page, url, division)
+
+    async def _get_content(self, page: Page, url: str, division: str = "") -> Any:
+        """
+        Grabs html from an already loaded page, failures are retried by _get_division
+        :param page: Browser page used for scraping
         :param url: Url that needs to bet scraped
+        :param division: Sub division of the page, used for the metrics
         :return: Html of the page
         """
-        page = self._page
-        page.goto(url)
-        for i in range(7):
-            page.mouse.wheel(0, 1000)
+        with STAGE_SECONDS.time(stage="content", division=division):
+            return await page.content()
+
+    async def _get_fingerprint(self, page: Page) -> str:
+        """
+        Hashes the dates, times, teams, odds and links of a loaded page
+        :param page: Browser page used for scraping
+        :return: Fingerprint of the games of the page
+        """
+        text = await page.evaluate(
+            FINGERPRINT_SCRIPT, [DAYDATE, PLAY_TIME, TEAMS, ODDS, SPORT_INFO]
+        )
+        return self._hash(text)
+
+    @staticmethod
+    def _hash(text: str) -> str:
+        """
+        Fingerprint of a text
+        :param text: Text to hash
+        :return: Hex digest
+        """
+        return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+    async def get_all_matches(
+        self, divisions: List[Tuple[str, str, str]]
+    ) -> Dict[Tuple[str, str], pd.DataFrame]:
+        """
+        Scrapes the given sports and subdivisions concurrently, using as many
+        pages of the pool in parallel as configured by concurrency
+        :param divisions: List of (sport, subdivision, url) to scrape
+        :return: Dictionary with the dataframe of every scraped (sport, subdivision)
+        """
+        results = await asyncio.gather(
+            *(self._get_division(sport, division, url) for sport, division, url in divisions)
+        )
+        return {
+            (sport, division): df
+            for (sport, division, _), df in zip(divisions, results)
+            if df is not None
+        }
+
+    async def _get_division(
+        self, sport: str, division: str, url: str
+    ) -> Optional[pd.DataFrame]:
+        """
+        Scrapes the given subdivision from all sources concurrently and
+        merges their matches, keeping the best odds of every outcome
+        :param sport: Sport that needs to be scraped
+        :param division: Sub division of the sport
+        :param url: Url of the subdivision in SPORTS
+        :return: Dataframe with scraped data or None if every source failed
+        """
+        targets = [
+            (source, source.get_url(sport, division, url)) for source in self.sources
+        ]
+        results = await asyncio.gather(
+            *(
+                self._get_source_division(source, sport, division, source_url)
+                for source, source_url in targets
+                if source_url is not None
+            )
+        )
+        frames = [df for df in results if df is not None]
+        if len(frames) < 2:
+            return frames[0] if frames else None
+        with STAGE_SECONDS.time(stage="merge", division=division):
+            return merge_sources(frames, self._team_aliases)
+
+    async def _get_source_division(
+        self, source: Source, sport: str, division: str, url: str
+    ) -> Optional[pd.DataFrame]:
+        """
+        Waits for a free page and scrapes the given subdivision of a source with it.
+        Failed attempts are retried with a fresh page and backoff, a page that
+        keeps failing is skipped until the cooldown of its circuit breaker passed
+        :param source: Source to scrape
+        :param sport: Sport that needs to be scraped
+        :param division: Sub division of the sport
+        :param url: Url of the subdivision on the source
+        :return: Dataframe with scraped data or None if it failed
+        """
+        if not self._breaker.allow(url):
+            CIRCUIT_OPEN.inc(division=division)
+            logger.info(f"Skipping {sport}: {division} of {source.name}, its page failed repeatedly")
+            return None
+
+        async def scrape() -> pd.DataFrame:
+            # only the scrape itself is timed, not the wait for a free page
+            async with self.pool.page() as page:
+                return await asyncio.wait_for(
+                    source.get_matches(self, page, sport, division, url),
+                    self._page_timeout,
+                )
+
+        def on_retry(attempt: int, e: Exception) -> None:
+            SCRAPE_RETRIES.inc(division=division)
+            logger.warning(
+                f"Attempt {attempt} to scrape {sport}: {division} of {source.name} failed. Exception {e!r}, retrying.."
+            )
 
-        page.wait_for_load_state("networkidle")
         try:
-            content = page.content()
-        except:
-            logger.warning(f"Could not retrive html from {url}. Retrying again")
-            self._get_html(url)
-        return content
+            df = await retry(
+                scrape,
+                self._attempts,
+                None,
+                self._backoff,
+                self._max_backoff,
+                on_retry,
+            )
+        except Exception as e:
+            SCRAPE_FAILURES.inc(division=division)
+            cooldown = self._breaker.record_failure(url)
+            logger.warning(
+                f"Could not scrape data for {sport}: {division} of {source.name}. Exception {e!r}, going to next.."
+            )
+            if cooldown is not None:
+                logger.warning(f"Skipping {sport}: {division} of {source.name} for the next {cooldown:.0f}s")
+            return None
+        self._breaker.record_success(url)
+        return df
 
-    def get_matches(self, sport: str, division: str, url: str) -> pd.DataFrame:
+    async def get_matches(
+        self, page: Page, sport: str, division: str, url: str
+    ) -> pd.DataFrame:
         """
         Grab the data from the url for a given sport and
         returns it as a dataframe
+        :param page: Browser page used for scraping
         :param sport: Sport that needs to be scraped
         :param division: Sub division of the sport
         :param url: Url that needs to bet scraped
         :return: Dataframe with scraped data
         """
         logger.info(f"Getting matches for {sport}: {division}..")
-        content = self._get_html(url)
-        soup = BeautifulSoup(content, "html.parser")
-        data = []
-
-        for day in soup.find_all("ul", class_=DAY):
-            date = day.find("div", class_=DAYDATE).text
-            sport_info = day.find_all("div", class_=SPORT_INFO)
-            play_time = day.find_all("div", class_=PLAY_TIME)
-            for i, game in enumerate(sport_info):
-                teams = game.find_all("div", class_=TEAMS)
-                odds = game.find_all("div", class_=ODDS)
-                game_time = play_time[i].text
-                images = [image.find("img") for image in odds]
-                try:
-                    info = get_3_way_data(
-                        date, sport, division, game_time, teams, odds, images, url
-                    )
-                    # still need to distinguish between 2 or 3 way and get game and subdivision beforehand
-                    data.append(info)
-                except Exception as e:
-                    logger.warning(
-                        f"Could not retrive data for {sport}: {division} on {date} "
-                        f"for {teams[0].text} vs. {teams[1].text}. Exception {e}, skipping entry."
-                    )
-        df = pd.DataFrame(data, columns=COLUMNS)
+        games = None
+        if self._capture.enabled:
+            with STAGE_SECONDS.time(stage="capture", division=division):
+                games = await self._capture.capture(page, url)
+            API_CAPTURES.inc(
+                division=division, result="fallback" if games is None else "captured"
+            )
+            if games is None:
+                logger.info(f"No odds payload for {sport}: {division}, scraping the page")
+        if games is None:
+            # a capture without payload already opened the page, it only needs scrolling
+            await self._load_page(page, url, division, navigate=not self._capture.enabled)
+        # the odds are read from here on
+        scraped_at = time.time()
+        fingerprint = None
+        if self._skip_unchanged:
+            with STAGE_SECONDS.time(stage="fingerprint", division=division):
+                if games is None:
+                    fingerprint = await self._get_fingerprint(page)
+                else:
+                    fingerprint = self._hash(json.dumps(games, sort_keys=True, default=str))
+            cached = self._pages.get(url)
+            if cached is not None and cached[0] == fingerprint:
+                PAGES.inc(division=division, result="unchanged")
+                logger.info(f"Odds unchanged for {sport}: {division}, reusing last matches")
+                df = cached[1].copy(deep=False)
+                # the odds are still the same, so they are as fresh as this scrape
+                df["scraped_at"] = scraped_at
+                # lets the bot skip the analysis of the division
+                df.attrs["unchanged"] = True
+                SCRAPED_MATCHES.inc(len(df), division=division)
+                return df
+        if games is not None:
+            with STAGE_SECONDS.time(stage="parse", division=division):
+                df = build_matches(games, sport, division, url, scraped_at)
+        elif self._extractor.in_page:
+            with STAGE_SECONDS.time(stage="parse", division=division):
+                games = await page.evaluate(
+                    self._extractor.script, self._extractor.selectors
+                )
+                df = build_matches(games, sport, division, url, scraped_at)
+        else:
+            content = await self._get_content(page, url, division)
+            # parse outside of the event loop so the other pages keep loading
+            loop = asyncio.get_running_loop()
+            with STAGE_SECONDS.time(stage="parse", division=division):
+                df = await loop.run_in_executor(
+                    None, self.parse_matches, content, sport, division, url, scraped_at
+                )
+        if fingerprint is not None:
+            self._pages[url] = (fingerprint, df)
+        PAGES.inc(division=division, result="changed")
+        SCRAPED_MATCHES.inc(len(df), division=division)
         logger.debug(f"Scraped data: \n {df}")  # change to debug
         logger.info(f"Matches ready for {sport}: {division}")
         return df
+
+    async def get_odds_grids(
+        self, urls: List[Optional[str]]
+    ) -> List[Optional[Dict[str, List[Optional[float]]]]]:
+        """
+        Opens the match pages concurrently and grabs the odds of every bookmaker
+        :param urls: Urls of the match pages, None if a match has no page
+        :return: For every match {book: [odds of every outcome]} or None if it failed
+        """
+        return await asyncio.gather(*(self._get_odds_grid(url) for url in urls))
+
+    async def _get_odds_grid(
+        self, url: Optional[str]
+    ) -> Optional[Dict[str, List[Optional[float]]]]:
+        """
+        Waits for a free page and grabs the odds table of a match page with it
+        :param url: Url of the match page
+        :return: {book: [odds of every outcome]} or None if it failed
+        """
+        if url is None or not self._breaker.allow(url):
+            return None
+        try:
+            async with self.pool.page() as page:
+                with STAGE_SECONDS.time(stage="deep", division=""):
+                    grid = await asyncio.wait_for(
+                        self._load_odds_grid(page, url), self._page_timeout
+                    )
+        except Exception as e:
+            self._breaker.record_failure(url)
+            logger.warning(f"Could not grab the odds of {url}. Exception {e!r}")
+            return None
+        self._breaker.record_success(url)
+        return grid
+
+    async def _load_odds_grid(
+        self, page: Page, url: str
+    ) -> Dict[str, List[Optional[float]]]:
+        """
+        Opens a match page and grabs its odds table
+        :param page: Browser page used for scraping
+        :param url: Url of the match page
+        :return: {book: [odds of every outcome]}, books named as in the listing
+        """
+        await page.goto(url)
+        await page.wait_for_load_state("networkidle")
+        return await page.evaluate(
+            EXTRACT_GRID_SCRIPT,
+            [GRID_ROW, GRID_CELL, GRID_HEADER, GRID_BOOK_ATTRIBUTE, GRID_ODDS_ATTRIBUTE],
+        )
+
+    def parse_matches(
+        self,
+        content: str,
+        sport: str,
+        division: str,
+        url: str,
+        scraped_at: Optional[float] = None,
+    ) -> pd.DataFrame:
+        """
+        Parses the html of a page for a given sport with the configured
+        extractor and returns the matches as a dataframe
+        :param content: Html of the page
+        :param sport: Sport that was scraped
+        :param division: Sub division of the sport
+        :param url: Url the html was scraped from
+        :param scraped_at: Unix time the html was scraped, defaults to now
+        :return: Dataframe with scraped data
+        """
+        return build_matches(self._extractor.parse(content), sport, division, url, scraped_at)
@@ -0,0 +1,233 @@
+import abc
+import importlib
+import logging
+import re
+import unicodedata
+from typing import TYPE_CHECKING, Any, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from playwright.async_api import Page
+
+from myodds.constants import BOOK_COLUMNS, ODDS_COLUMNS
+from myodds.utils import parse_kickoff
+
+if TYPE_CHECKING:
+    from myodds.scraper.scraper import Scraper
+
+
+logger = logging.getLogger(__name__)
+
+# words that some sources add to team names and others leave out
+TEAM_AFFIXES = {"ac", "afc", "as", "calcio", "cf", "club", "fc", "sc", "ssc", "us"}
+
+
+class Source(abc.ABC):
+    """
+    Adapter of a website with odds. It maps the subdivisions to the pages of
+    the website and reads the matches of a page into a dataframe with the
+    COLUMNS of build_matches, one row per match with the best odds of the website
+    """
+
+    def __init__(self, name: str, settings: Dict[str, Any]) -> None:
+        """
+        Initialization of class
+        :param name: Name of the source in the configuration
+        :param settings: Configuration of the source, urls maps sport and subdivision to a page
+        :return: None
+        """
+        self.name = name
+        self._urls: Dict[str, Dict[str, str]] = settings.get("urls", {})
+
+    def get_url(self, sport: str, division: str, url: str) -> Optional[str]:
+        """
+        Page of a subdivision on the website
+        :param sport: Sport that needs to be scraped
+        :param division: Sub division of the sport
+        :param url: Url of the subdivision in SPORTS
+        :return: Url or None if the source does not cover the subdivision
+        """
+        return self._urls.get(sport, {}).get(division)
+
+    @abc.abstractmethod
+    async def get_matches(
+        self, scraper: "Scraper", page: Page, sport: str, division: str, url: str
+    ) -> pd.DataFrame:
+        """
+        Grabs the matches of a subdivision
+        :param scraper: Scraper with the helpers to load and parse pages
+        :param page: Browser page used for scraping
+        :param sport: Sport that needs to be scraped
+        :param division: Sub division of the sport
+        :param url: Url of the subdivision on the website
+        :return: Dataframe with scraped data
+        """
+
+
+class OddscheckerSource(Source):
+    """
+    https://www.oddschecker.com/it, whose pages are the urls of SPORTS
+    """
+
+    def get_url(self, sport: str, division: str, url: str) -> Optional[str]:
+        return self._urls.get(sport, {}).get(division, url)
+
+    async def get_matches(
+        self, scraper: "Scraper", page: Page, sport: str, division: str, url: str
+    ) -> pd.DataFrame:
+        return await scraper.get_matches(page, sport, division, url)
+
+
+SOURCES = {"oddschecker": OddscheckerSource}
+
+
+def load_sources(config: Dict[str, Any]) -> List[Source]:
+    """
+    Creates the enabled sources, the first one is the primary source
+    whose matches are kept when a match is on several sources
+    :param config: Configuration dictionary
+    :return: List of sources, only oddschecker if none is configured
+    """
+    sources = []
+    for name, settings in config.get("sources", {"oddschecker": {}}).items():
+        if not settings.get("enabled", True):
+            continue
+        adapter = settings.get("adapter")
+        if adapter is None and name not in SOURCES:
+            logger.warning(f"Unknown source {name} without an adapter. Skipping it")
+            continue
+        if adapter is None:
+            source_class = SOURCES[name]
+        else:
+            # "module:Class" of a custom source
+            module, _, class_name = adapter.partition(":")
+            source_class = getattr(importlib.import_module(module), class_name)
+        sources.append(source_class(name, settings))
+    return sources
+
+
+def canonical_team(name: Any, aliases: Optional[Dict[str, str]] = None) -> str:
+    """
+    Normalizes a team name, so the spellings of different sources
+    (e.g. "A.C. Milan" and "Milan") are equal
+    :param name: Scraped team name
+    :param aliases: Canonical names of other canonical names (e.g. inter -> internazionale)
+    :return: Lower case ascii name without punctuation and affixes
+    """
+    text = unicodedata.normalize("NFKD", str(name)).encode("ascii", "ignore").decode()
+    # dotted abbreviations like "A.C." become one word
+    text = text.lower().replace(".", "")
+    words = [word for word in re.findall(r"[a-z0-9]+", text) if word not in TEAM_AFFIXES]
+    canonical = " ".join(words)
+    return (aliases or {}).get(canonical, canonical)
+
+
+def get_match_keys(
+    df: pd.DataFrame, aliases: Optional[Dict[str, str]] = None
+) -> List[Hashable]:
+    """
+    Normalized key of every match: the canonical teams and the kickoff.
+    Dates which can not be parsed are compared as scraped
+    :param df: Dataframe containing scraped data
+    :param aliases: Canonical names of other canonical names
+    :return: List of keys in the order of the rows
+    """
+    keys: List[Hashable] = []
+    # the matches of a page share a few dates and times
+    kickoffs: Dict[Tuple[Any, Any], Any] = {}
+    for team1, team2, date, play_time in df[
+        ["team1", "team2", "date", "play_time"]
+    ].itertuples(index=False, name=None):
+        kickoff = kickoffs.get((date, play_time))
+        if kickoff is None:
+            kickoff = parse_kickoff(date, play_time) or (date, play_time)
+            kickoffs[(date, play_time)] = kickoff
+        keys.append(
+            (canonical_team(team1, aliases), canonical_team(team2, aliases), kickoff)
+        )
+    return keys
+
+
+def merge_sources(
+    frames: List[pd.DataFrame], aliases: Optional[Dict[str, str]] = None
+) -> pd.DataFrame:
+    """
+    Hash joins the matches of a subdivision scraped from several sources on
+    their normalized keys and keeps the best odd of every outcome with its
+    bookmaker. Matches only one source has are added. The data source of a
+    match lists the pages its odds come from. Every row is hashed and looked
+    up once, so the merge is linear in the number of matches
+    :param frames: Dataframes of the sources, the first is the primary source
+    :param aliases: Canonical names of other canonical names
+    :return: Dataframe with one row per match, in the order of the sources
+    """
+    aliases = {
+        canonical_team(name): canonical_team(alias) for name, alias in (aliases or {}).items()
+    }
+    parts = [frames[0].reset_index(drop=True)]
+    index: Dict[Hashable, int] = {}
+    for row, key in enumerate(get_match_keys(parts[0], aliases)):
+        index.setdefault(key, row)
+    odds = parts[0][ODDS_COLUMNS].to_numpy(dtype=float).copy()
+    books = parts[0][BOOK_COLUMNS].to_numpy(dtype=object).copy()
+    scraped_at = parts[0]["scraped_at"].to_numpy(dtype=float).copy()
+    # page of every odd
+    pages = np.repeat(
+        parts[0][["data_source"]].to_numpy(dtype=object), len(ODDS_COLUMNS), axis=1
+    )
+    for frame in frames[1:]:
+        frame = frame.reset_index(drop=True)
+        frame_odds = frame[ODDS_COLUMNS].to_numpy(dtype=float)
+        frame_books = frame[BOOK_COLUMNS].to_numpy(dtype=object)
+        frame_scraped_at = frame["scraped_at"].to_numpy(dtype=float)
+        frame_pages = np.repeat(
+            frame[["data_source"]].to_numpy(dtype=object), len(ODDS_COLUMNS), axis=1
+        )
+        joined: List[int] = []
+        targets: List[int] = []
+        added: List[int] = []
+        seen = set()
+        for i, key in enumerate(get_match_keys(frame, aliases)):
+            if key in seen:
+                # a source listing a match twice only counts with its first row
+                continue
+            seen.add(key)
+            target = index.get(key)
+            if target is None:
+                index[key] = len(odds) + len(added)
+                added.append(i)
+            else:
+                joined.append(i)
+                targets.append(target)
+        if joined:
+            current = odds[targets]
+            other = frame_odds[joined]
+            better = (other > current) | (np.isnan(current) & ~np.isnan(other))
+            odds[targets] = np.where(better, other, current)
+            books[targets] = np.where(better, frame_books[joined], books[targets])
+            pages[targets] = np.where(better, frame_pages[joined], pages[targets])
+            # a match is as old as the oldest odds it uses
+            scraped_at[targets] = np.where(
+                better.any(axis=1),
+                np.fmin(scraped_at[targets], frame_scraped_at[joined]),
+                scraped_at[targets],
+            )
+        if added:
+            parts.append(frame.iloc[added])
+            odds = np.concatenate([odds, frame_odds[added]])
+            books = np.concatenate([books, frame_books[added]])
+            scraped_at = np.concatenate([scraped_at, frame_scraped_at[added]])
+            pages = np.concatenate([pages, frame_pages[added]])
+        logger.debug(f"Joined {len(joined)} and added {len(added)} of {len(frame)} matches")
+    df = pd.concat(parts, ignore_index=True)
+    df[ODDS_COLUMNS] = odds
+    df[BOOK_COLUMNS] = books
+    df["scraped_at"] = scraped_at
+    used = ~np.isnan(odds)
+    df["data_source"] = [
+        " | ".join(dict.fromkeys(row_pages[row_used])) or row_pages[0]
+        for row_pages, row_used in zip(pages, used)
+    ]
+    # the analysis can only be skipped if no source changed
+    df.attrs["unchanged"] = all(frame.attrs.get("unchanged", False) for frame in frames)
+    return df
@@ -0,0 +1,134 @@
+import logging
+from typing import Any, Dict, List, Set, Tuple
+
+import pandas as pd
+
+from myodds.constants import BOOK_COLUMNS, MATCH_KEY_COLUMNS, ODDS_COLUMNS
+
+
+logger = logging.getLogger(__name__)
+
+MatchKey = Tuple[Any, ...]
+
+
+class SnapshotStore:
+    """
+    Keeps the last scraped odds of every subdivision in memory, so only
+    new or changed matches are analyzed and an opportunity is only
+    notified again if its expected win improved
+    """
+
+    def __init__(self, config: Dict[str, Any]) -> None:
+        """
+        Initialization of class
+        :param config: Configuration dictionary
+        :return: None
+        """
+        self._min_improvement = float(config.get("min_win_improvement", 0.005))
+        self._snapshots: Dict[Tuple[str, str], pd.DataFrame] = {}
+        # subdivisions whose snapshot misses discarded matches
+        self._partial: Set[Tuple[str, str]] = set()
+        # expected win of every notified opportunity which is still open
+        self._notified: Dict[MatchKey, float] = {}
+
+    def diff(
+        self, sport: str, division: str, df: pd.DataFrame
+    ) -> Tuple[pd.DataFrame, List[MatchKey]]:
+        """
+        Compares the scraped data of a subdivision with the previous cycle
+        and stores it as the new snapshot
+        :param sport: Sport that was scraped
+        :param division: Sub division of the sport
+        :param df: Dataframe containing scraped data
+        :return: New or changed rows and the keys of the removed matches
+        """
+        df = df.drop_duplicates(subset=MATCH_KEY_COLUMNS, keep="last")
+        current = df[MATCH_KEY_COLUMNS + ODDS_COLUMNS + BOOK_COLUMNS].set_index(
+            MATCH_KEY_COLUMNS
+        )
+        previous = self._snapshots.get((sport, division))
+        self._snapshots[(sport, division)] = current
+        self._partial.discard((sport, division))
+        if previous is None:
+            return df.copy(), []
+        aligned = previous.reindex(current.index)
+        same = ((current == aligned) | (current.isna() & aligned.isna())).all(axis=1)
+        changed = ~(same & current.index.isin(previous.index))
+        removed = previous.index.difference(current.index).tolist()
+        logger.debug(
+            f"{division}: {int(changed.sum())} new or changed, {len(removed)} removed matches"
+        )
+        return df[changed.to_numpy()].copy(), removed
+
+    def has(self, sport: str, division: str) -> bool:
+        """
+        Checks if there is a complete snapshot of a subdivision
+        :param sport: Sport that was scraped
+        :param division: Sub division of the sport
+        :return: True if the subdivision was scraped before and none of its matches were discarded
+        """
+        return (sport, division) in self._snapshots and (sport, division) not in self._partial
+
+    def reset(self, sport: str, division: str) -> None:
+        """
+        Forgets the snapshot of a subdivision, so all of its matches
+        are analyzed again in the next cycle
+        :param sport: Sport as scraped or as in the data (title case)
+        :param division: Sub division of the sport
+        :return: None
+        """
+        for key in list(self._snapshots):
+            if key[0].title() == sport.title() and key[1] == division:
+                del self._snapshots[key]
+
+    def discard(self, keys: List[MatchKey]) -> None:
+        """
+        Removes matches from the snapshots of their subdivisions, so they
+        are analyzed again in the next cycle even if their odds did not change
+        :param keys: Keys of the matches
+        :return: None
+        """
+        for (sport, division), snapshot in list(self._snapshots.items()):
+            division_keys = [
+                key for key in keys if key[0] == sport.title() and key[1] == division
+            ]
+            if not division_keys:
+                continue
+            kept = ~snapshot.index.isin(division_keys)
+            if not kept.all():
+                self._snapshots[(sport, division)] = snapshot[kept]
+                self._partial.add((sport, division))
+
+    def filter_notifications(
+        self,
+        df: pd.DataFrame,
+        key_columns: List[str] = MATCH_KEY_COLUMNS,
+        value_column: str = "expected_win",
+    ) -> pd.DataFrame:
+        """
+        Keeps only opportunities which were not notified yet or whose
+        expected win improved by at least min_win_improvement, and remembers them
+        :param df: Dataframe containing the opportunities with expected win
+        :param key_columns: Columns identifying an opportunity
+        :param value_column: Column with the expected win of an opportunity
+        :return: Dataframe with the opportunities that should be notified
+        """
+        keys = list(df[key_columns].itertuples(index=False, name=None))
+        notify = []
+        for key, expected_win in zip(keys, df[value_column]):
+            previous = self._notified.get(key)
+            is_new = previous is None or expected_win >= previous + self._min_improvement
+            if is_new:
+                self._notified[key] = expected_win
+            notify.append(is_new)
+        return df[notify]
+
+    def forget(self, keys: List[MatchKey]) -> None:
+        """
+        Forgets notified opportunities which are gone, so they are
+        notified again when they open up again
+        :param keys: Keys of the matches
+        :return: None
+        """
+        for key in keys:
+            self._notified.pop(key, None)
@@ -1,5 +1,9 @@
 import json
-from typing import Any, Dict, List
+import os
+import re
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
 
 
 def load_config() -> Dict[str, Any]:
@@ -12,6 +16,133 @@ def load_config() -> Dict[str, Any]:
         return config
 
 
+def get_divisions(sports: Dict[str, Dict[str, str]]) -> List[Tuple[str, str, str]]:
+    """
+    Flattens the sports dictionary into a list of subdivisions
+    :param sports: Dictionary of sports with their subdivisions and urls
+    :return: List of (sport, subdivision, url)
+    """
+    return [
+        (sport, division, url)
+        for sport, subdivision in sports.items()
+        for division, url in subdivision.items()
+    ]
+
+
+MONTHS = {
+    month: number
+    for number, names in enumerate(
+        [
+            ("gen", "jan"),
+            ("feb",),
+            ("mar",),
+            ("apr",),
+            ("mag", "may"),
+            ("giu", "jun"),
+            ("lug", "jul"),
+            ("ago", "aug"),
+            ("set", "sep"),
+            ("ott", "oct"),
+            ("nov",),
+            ("dic", "dec"),
+        ],
+        start=1,
+    )
+    for month in names
+}
+
+
+def parse_kickoff(
+    date: str, play_time: str, now: Optional[datetime] = None
+) -> Optional[datetime]:
+    """
+    Best effort conversion of the scraped date and play time into a datetime.
+    Understands today/tomorrow, "21 gennaio" like dates and "21/01" dates
+    :param date: Scraped date of the day the game is played
+    :param play_time: Scraped time when the game is played
+    :param now: Reference time, defaults to the current time
+    :return: Kickoff as datetime or None if it can not be parsed
+    """
+    now = now or datetime.now()
+    time_match = re.search(r"(\d{1,2})[:.](\d{2})", str(play_time))
+    if time_match is None:
+        return None
+    hour, minute = int(time_match.group(1)), int(time_match.group(2))
+    date = str(date).lower()
+    if "oggi" in date or "today" in date:
+        day = now.date()
+    elif "domani" in date or "tomorrow" in date:
+        day = (now + timedelta(days=1)).date()
+    else:
+        named = re.search(r"(\d{1,2})\s+([a-z]{3})", date)
+        numeric = re.search(r"(\d{1,2})[/.-](\d{1,2})", date)
+        if named and named.group(2) in MONTHS:
+            day_number, month = int(named.group(1)), MONTHS[named.group(2)]
+        elif numeric:
+            day_number, month = int(numeric.group(1)), int(numeric.group(2))
+        else:
+            return None
+        try:
+            day = now.replace(month=month, day=day_number).date()
+        except ValueError:
+            return None
+        # listings only show upcoming games, so a date far behind is next year
+        if day < (now - timedelta(days=7)).date():
+            day = day.replace(year=day.year + 1)
+    try:
+        return datetime(day.year, day.month, day.day, hour, minute)
+    except ValueError:
+        return None
+
+
+def normalize_date(date: Any, play_time: Any, now: Optional[datetime] = None) -> Any:
+    """
+    Writes the scraped date of a game as "21/01", so a match has the same
+    date whether its page was parsed ("Oggi", "21 gennaio") or its odds api
+    was captured, and it does not change when "Domani" becomes "Oggi"
+    :param date: Scraped date of the day the game is played
+    :param play_time: Scraped time when the game is played
+    :param now: Reference time, defaults to the current time
+    :return: Normalized date or the scraped date if it can not be parsed
+    """
+    kickoff = parse_kickoff(date, play_time, now)
+    return kickoff.strftime("%d/%m") if kickoff is not None else date
+
+
+def get_process_tree_rss(pid: Optional[int] = None) -> Optional[float]:
+    """
+    Sums the resident memory of a process and all of its children
+    (e.g. the browser started by playwright). Only works where /proc exists
+    :param pid: Process id of the root process, defaults to the current process
+    :return: Resident memory in megabytes or None if it can not be measured
+    """
+    proc = Path("/proc")
+    if not proc.is_dir():
+        return None
+    root = pid or os.getpid()
+    children: Dict[int, List[int]] = {}
+    rss_pages: Dict[int, int] = {}
+    for stat in proc.glob("[0-9]*/stat"):
+        try:
+            data = stat.read_text()
+        except OSError:
+            continue
+        # the process name can contain spaces, the fields after it can not
+        fields = data[data.rindex(")") + 2 :].split()
+        process = int(stat.parent.name)
+        children.setdefault(int(fields[1]), []).append(process)
+        rss_pages[process] = int(fields[21])
+    if root not in rss_pages:
+        return None
+    total = 0
+    todo = [root]
+    while todo:
+        process = todo.pop()
+        total += rss_pages.get(process, 0)
+        todo.extend(children.get(process, []))
+    return total * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
 def get_3_way_data(
     date: str,
     sport: str,
@@ -19,7 +150,7 @@ def get_3_way_data(
     game_time: str,
     teams: List[str],
     odds: List[str],
-    images: List[str],
+    books: List[Optional[str]],
     url: str,
 ) -> Dict[str, Any]:
     """
@@ -29,8 +160,9 @@ def get_3_way_data(
     :param sport: Type of sport
     :param division: Sub divison of the sport
     :param game_time: Time when the game is played
-    :param teams: List containing the best books
+    :param teams: List containing the team names
     :param odds: List containing the odds from the different books
+    :param books: List containing the best books
     :param url: Url where the data is scraped from
     :return: Dictionary containing scraped data
     """
@@ -39,14 +171,14 @@ def get_3_way_data(
         "sport": sport.title(),
         "sport_subdivision": division,
         "play_time": game_time,
-        "team1": teams[0].text,
-        "team2": teams[1].text,
-        "home_odds": float(odds[0].text),
-        "draw_odds": float(odds[1].text),
-        "away_odds": float(odds[2].text),
-        "home_book": images[0]["alt"],
-        "draw_book": images[1]["alt"],
-        "away_book": images[2]["alt"],
+        "team1": teams[0],
+        "team2": teams[1],
+        "home_odds": float(odds[0]),
+        "draw_odds": float(odds[1]),
+        "away_odds": float(odds[2]),
+        "home_book": _get_book(books[0]),
+        "draw_book": _get_book(books[1]),
+        "away_book": _get_book(books[2]),
         "data_source": url,
     }
 
@@ -58,18 +190,19 @@ def get_2_way_data(
     game_time: str,
     teams: List[str],
     odds: List[str],
-    images: List[str],
+    books: List[Optional[str]],
     url: str,
 ) -> Dict[str, Any]:
     """
     Gets all necessary scraped data for a sport which has
-    home, draw and away odds and returns it as a dictionary
+    home and away odds and returns it as a dictionary
     :param date: Date when the game is played
     :param sport: Type of sport
     :param division: Sub divison of the sport
     :param game_time: Time when the game is played
-    :param teams: List containing the best books
+    :param teams: List containing the team names
     :param odds: List containing the odds from the different books
+    :param books: List containing the best books
     :param url: Url where the data is scraped from
     :return: Dictionary containing scraped data
     """
@@ -78,13 +211,24 @@ def get_2_way_data(
         "sport": sport.title(),
         "sport_subdivision": division,
         "play_time": game_time,
-        "team1": teams[0].text,
-        "team2": teams[1].text,
-        "home_odds": float(odds[0].text),
+        "team1": teams[0],
+        "team2": teams[1],
+        "home_odds": float(odds[0]),
         "draw_odds": None,
-        "away_odds": float(odds[-1].text),
-        "home_book": images[0]["alt"],
+        "away_odds": float(odds[-1]),
+        "home_book": _get_book(books[0]),
         "draw_book": None,
-        "away_book": images[-1]["alt"],
+        "away_book": _get_book(books[-1]),
         "data_source": url,
     }
+
+
+def _get_book(book: Optional[str]) -> str:
+    """
+    Makes sure the bookmaker of an odd was found
+    :param book: Scraped bookmaker name
+    :return: Bookmaker name
+    """
+    if book is None:
+        raise ValueError("Bookmaker of the odd is missing")
+    return book
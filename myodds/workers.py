@@ -0,0 +1,187 @@
+"""
+Worker mode: the subdivisions are split into shards which are scraped by
+separate processes, each with its own browser and optional proxy. A single
+coordinator analyzes their results and sends the notifications, so a crashing
+worker only loses its own shard until it is restarted
+"""
+
+import copy
+import logging
+import multiprocessing
+import queue
+import time
+from typing import Any, Dict, List, Tuple
+
+from myodds.constants import SPORTS
+from myodds.myoddsbot import MyOddsBot
+from myodds.utils import get_divisions
+
+
+logger = logging.getLogger(__name__)
+
+Division = Tuple[str, str, str]
+
+
+def get_shards(divisions: List[Division], count: int) -> List[List[Division]]:
+    """
+    Splits the subdivisions round robin, so every shard gets a mix of sports
+    :param divisions: List of (sport, subdivision, url)
+    :param count: Number of shards
+    :return: List of shards, without empty shards
+    """
+    shards = [divisions[i::count] for i in range(max(1, count))]
+    return [shard for shard in shards if shard]
+
+
+def get_worker_config(config: Dict[str, Any], index: int) -> Dict[str, Any]:
+    """
+    Configuration of a worker: its own proxy and metrics port, while
+    telegram, history and the api are left to the coordinator
+    :param config: Configuration dictionary
+    :param index: Index of the worker
+    :return: Configuration dictionary of the worker
+    """
+    worker_config = copy.deepcopy(config)
+    worker_config["telegram"] = {**worker_config["telegram"], "enabled": False}
+    worker_config["history"] = {**worker_config.get("history", {}), "enabled": False}
+    worker_config["api"] = {**worker_config.get("api", {}), "enabled": False}
+    proxies = config["workers"].get("proxies", [])
+    if proxies:
+        worker_config["proxy"] = {"enabled": True, "server": proxies[index % len(proxies)]}
+    metrics = worker_config.get("metrics", {})
+    if metrics.get("enabled", False):
+        # a range of its own, so it can not collide with the ports of the coordinator
+        metrics["port"] = int(config["workers"].get("metrics_base_port", 9200)) + index
+    return worker_config
+
+
+def run_worker(
+    config: Dict[str, Any],
+    index: int,
+    shard: List[Division],
+    results: "multiprocessing.Queue",
+) -> None:
+    """
+    Entry point of a worker process, scrapes its shard whenever it is due
+    and puts the results on the queue of the coordinator
+    :param config: Configuration dictionary of the worker
+    :param index: Index of the worker
+    :param shard: List of (sport, subdivision, url) to scrape
+    :param results: Queue of the coordinator
+    :return: None
+    """
+    # the worker is spawned, so the logging of main has to be set up again
+    from myodds.main import LOGFORMAT
+
+    logging.basicConfig(
+        level=logging.INFO, format=f"worker-{index} - {LOGFORMAT}", force=True
+    )
+    bot = MyOddsBot(config)
+
+    async def handler(divisions: List[Division]):
+        matches, odds_grid = await bot.scrape_divisions(divisions)
+        results.put((index, matches, odds_grid))
+        return matches
+
+    logger.info(f"Worker {index} scrapes {[division for _, division, _ in shard]}")
+    try:
+        bot.run_forever(shard, handler)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        bot.stop()
+
+
+class Coordinator:
+    """
+    Starts a worker process per shard, analyzes the results of all workers
+    and restarts workers which died
+    """
+
+    def __init__(self, bot: MyOddsBot, config: Dict[str, Any]) -> None:
+        """
+        Initialization of class
+        :param bot: Bot analyzing the results and sending the notifications
+        :param config: Configuration dictionary
+        :return: None
+        """
+        self._bot = bot
+        self._config = config
+        workers = config["workers"]
+        self._shards = get_shards(get_divisions(SPORTS), int(workers.get("count", 2)))
+        self._restart_delay = float(workers.get("restart_delay", 10))
+        # spawn instead of fork, the parent may already run threads (telegram, history)
+        self._context = multiprocessing.get_context("spawn")
+        self._results = self._context.Queue()
+        self._processes: Dict[int, multiprocessing.Process] = {}
+        self._restart_at: Dict[int, float] = {}
+
+    def run(self) -> None:
+        """
+        Runs the workers and analyzes their results forever
+        :return: None
+        """
+        self._bot.listen()
+        for index in range(len(self._shards)):
+            self._start_worker(index)
+        while True:
+            try:
+                index, matches, odds_grid = self._results.get(timeout=1)
+            except queue.Empty:
+                self._check_workers()
+                continue
+            logger.debug(f"Analyzing {len(matches)} subdivisions of worker {index}")
+            self._bot.analyze(matches, odds_grid)
+            self._check_workers()
+
+    def stop(self) -> None:
+        """
+        Stops all workers
+        :return: None
+        """
+        for process in self._processes.values():
+            if process.is_alive():
+                process.terminate()
+        for process in self._processes.values():
+            process.join(timeout=10)
+        self._results.close()
+
+    def _start_worker(self, index: int) -> None:
+        """
+        Starts the worker process of a shard
+        :param index: Index of the worker
+        :return: None
+        """
+        process = self._context.Process(
+            target=run_worker,
+            args=(
+                get_worker_config(self._config, index),
+                index,
+                self._shards[index],
+                self._results,
+            ),
+            name=f"myodds-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        self._processes[index] = process
+        logger.info(f"Started worker {index} (pid {process.pid})")
+
+    def _check_workers(self) -> None:
+        """
+        Restarts workers which died, after the restart delay
+        :return: None
+        """
+        now = time.monotonic()
+        for index, process in self._processes.items():
+            if process.is_alive():
+                continue
+            if index not in self._restart_at:
+                logger.warning(
+                    f"Worker {index} died with exit code {process.exitcode}, "
+                    f"restarting in {self._restart_delay:.0f}s"
+                )
+                self._restart_at[index] = now + self._restart_delay
+            elif now >= self._restart_at[index]:
+                del self._restart_at[index]
+                self._start_worker(index)